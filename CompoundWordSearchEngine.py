@@ -5,11 +5,13 @@
 Enhanced Vietnamese Search Engine với Compound Word Support
 """
 
-import json
+import gc
 import time
 from typing import List, Dict, Any, Tuple
 from collections import defaultdict
 from VietnameseCompoundTokenizer import VietnameseCompoundTokenizer
+from DataHandler import read_json
+
 
 class CompoundWordSearchEngine:
     """
@@ -27,12 +29,13 @@ class CompoundWordSearchEngine:
         self.term_to_chunks = defaultdict(list)  # inverted index
         self.compound_to_chunks = defaultdict(list)  # compound word index
         
-    def load_documents(self):
-        """Load documents từ JSON file"""
+    def load_documents(self, documents: List[Dict] = None):
+        """Load documents từ JSON file, hoặc dùng documents đã parse sẵn (dùng chung, không copy)"""
         print("📋 Loading documents...")
         
-        with open(self.data_path, 'r', encoding='utf-8') as f:
-            self.documents = json.load(f)
+        if documents is None:
+            documents = read_json(self.data_path)
+        self.documents = documents
         
         print(f"   ✓ Loaded {len(self.documents)} documents")
     
@@ -91,8 +94,9 @@ class CompoundWordSearchEngine:
                 self.term_to_chunks[compound].append(chunk_id)
             
             # Index bigrams (for fallback)
+            compounds = set(enhanced['compounds'])
             for bigram in enhanced['bigrams']:
-                if bigram not in enhanced['compounds']:  # Avoid duplicates
+                if bigram not in compounds:  # Avoid duplicates
                     self.term_to_chunks[bigram].append(chunk_id)
         
         # Statistics
@@ -111,8 +115,9 @@ class CompoundWordSearchEngine:
         - Exact phrase matches get boost
         - Individual tokens get standard weight
         """
+        # Lowercase và đếm số từ một lần cho cả query
         content = chunk['content'].lower()
-        content_enhanced = self.tokenizer.tokenize_enhanced(content)
+        num_words = len(content.split())
         
         score = 0.0
         matches = []
@@ -121,7 +126,9 @@ class CompoundWordSearchEngine:
             # Check if term is a compound word
             is_compound = ' ' in term
             
-            if term in content.lower():
+            # count() == 0 khi không có: một lần scan thay vì 'in' rồi count()
+            term_count = content.count(term)
+            if term_count:
                 if is_compound:
                     # Compound word exact match: high score
                     boost = 3.0
@@ -130,8 +137,7 @@ class CompoundWordSearchEngine:
                 else:
                     # Individual token match: standard score
                     boost = 1.0
-                    term_count = content.lower().count(term)
-                    score += boost * term_count / len(content.split())
+                    score += boost * term_count / num_words
                     matches.append(f"token:{term}({term_count})")
             
             # Partial compound matching
@@ -139,7 +145,7 @@ class CompoundWordSearchEngine:
                 compound_tokens = term.split()
                 partial_matches = 0
                 for token in compound_tokens:
-                    if token in content.lower():
+                    if token in content:
                         partial_matches += 1
                 
                 if partial_matches > 0:
@@ -149,7 +155,7 @@ class CompoundWordSearchEngine:
                     matches.append(f"partial:{term}({partial_matches}/{len(compound_tokens)})")
         
         # Normalize by content length
-        normalized_score = score / max(len(content.split()), 10)
+        normalized_score = score / max(num_words, 10)
         
         return normalized_score, matches
     
@@ -257,11 +263,11 @@ def test_compound_search():
     engine = CompoundWordSearchEngine('data_content.json')
     
     # Build index
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     engine.load_documents()
     engine.create_chunks()
     engine.build_compound_index()
-    build_time = time.time() - start_time
+    build_time = (time.perf_counter_ns() - start_ns) / 1e9
     
     print(f"\n✅ Index built in {build_time:.2f}seconds")
     print(f"   📄 Documents: {len(engine.documents)}")
@@ -282,9 +288,14 @@ def test_compound_search():
     for query in test_queries:
         print("\n" + "="*70)
         
-        start = time.time()
-        results = engine.search(query, top_k=3)
-        search_time = time.time() - start
+        # Không để GC chen vào phép đo
+        gc.disable()
+        try:
+            start_ns = time.perf_counter_ns()
+            results = engine.search(query, top_k=3)
+            search_time = (time.perf_counter_ns() - start_ns) / 1e9
+        finally:
+            gc.enable()
         
         engine.print_results(query, results)
         print(f"\n⏱️ Search time: {search_time:.3f}s")
@@ -297,16 +308,20 @@ def compare_with_simple_search():
     print("📊 COMPARISON: Compound vs Simple Search")
     print("=" * 70)
     
-    from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine
+    from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine, enable_console_logging
+    enable_console_logging()
+    
+    # Parse data một lần cho cả hai engines
+    documents = read_json('data_content.json')
     
     # Initialize engines
     compound_engine = CompoundWordSearchEngine('data_content.json')
-    compound_engine.load_documents()
+    compound_engine.load_documents(documents)
     compound_engine.create_chunks()
     compound_engine.build_compound_index()
     
     simple_engine = FixedEnhancedSearchEngine('data_content.json')
-    simple_engine.build_index()
+    simple_engine.build_index(documents)
     
     # Test cases
     test_cases = ["Việt Nam", "Hồ Chí Minh", "Điện Biên Phủ"]
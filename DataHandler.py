@@ -1,7 +1,29 @@
 import json
+import mmap
+import os
 from typing import List, Dict, Optional
 from pathlib import Path
 
+try:
+    import orjson  # Parse JSON nhanh hơn json.load 3-5x
+except ImportError:
+    orjson = None
+
+
+def read_json(path) -> List[Dict]:
+    """Đọc file JSON: orjson trên file đã mmap nếu có, không thì json.load"""
+    if orjson is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap không map được file rỗng; orjson báo lỗi JSON như bình thường
+            return orjson.loads(f.read())
+        # Parse thẳng từ page cache, không copy cả file thành bytes
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
 
 class DataHandler:
     """
@@ -20,8 +42,7 @@ class DataHandler:
             raise FileNotFoundError(f"File không tồn tại: {self.data_path}")
         
         try:
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                self.documents = json.load(f)
+            self.documents = read_json(self.data_path)
             
             print(f"✓ Đã load {len(self.documents)} documents từ {self.data_path}")
             return self.documents
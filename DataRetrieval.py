@@ -1,8 +1,37 @@
+import math
 import numpy as np
 from typing import List, Dict, Tuple
-from rank_bm25 import BM25Okapi
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from SparseBM25 import SparseBM25
+from QuantizedEmbeddings import compress_embeddings
+
+try:
+    import faiss  # Optional: top-k semantic search bằng SIMD kernels của FAISS
+except ImportError:
+    faiss = None
+
+# Từ số documents này trở lên dùng IVF (search ~nprobe/nlist corpus) thay vì flat
+_IVF_MIN_DOCS = 10000
+
+# Index factory suffix cho từng embedding_precision
+_FAISS_STORAGE = {'float32': 'Flat', 'float16': 'SQfp16', 'int8': 'SQ8'}
+
+
+@lru_cache(maxsize=4)
+def _load_model(model_name: str) -> SentenceTransformer:
+    """Load SentenceTransformer một lần mỗi process; các engine dùng chung weights"""
+    return SentenceTransformer(model_name)
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices của k scores cao nhất, giảm dần; O(N + k log k) thay vì sort cả N"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+    return top[np.argsort(-scores[top], kind='stable')]
 
 
 class DataRetrieval:
@@ -17,17 +46,25 @@ class DataRetrieval:
                  embedding_model: str = 'keepitreal/vietnamese-sbert',
                  use_bm25: bool = True,
                  use_embedding: bool = True,
-                 bm25_weight: float = 0.5):
+                 bm25_weight: float = 0.5,
+                 embedding_precision: str = 'float32',
+                 use_faiss: bool = True):
         """
         Args:
             embedding_model: Tên model embedding (cho tiếng Việt)
             use_bm25: Có sử dụng BM25 không
             use_embedding: Có sử dụng embedding không
             bm25_weight: Trọng số cho BM25 (0-1), còn lại là embedding
+            embedding_precision: Kiểu lưu document embeddings ('float32', 'float16'
+                hoặc 'int8'; int8 nhỏ hơn 4x, score lệch ~1e-3)
+            use_faiss: Dùng FAISS index cho embedding top-k nếu faiss đã cài
+                (IndexFlatIP; IVF khi >= 10k documents)
         """
         self.use_bm25 = use_bm25
         self.use_embedding = use_embedding
         self.bm25_weight = bm25_weight
+        self.embedding_precision = embedding_precision
+        self.use_faiss = use_faiss
         
         # Khởi tạo BM25
         self.bm25 = None
@@ -36,8 +73,10 @@ class DataRetrieval:
         # Khởi tạo embedding model
         if use_embedding:
             print(f"Đang load embedding model: {embedding_model}...")
-            self.embedding_model = SentenceTransformer(embedding_model)
+            self.embedding_model = _load_model(embedding_model)
             self.document_embeddings = None
+            self.faiss_index = None
+            self._encode_query = lru_cache(maxsize=1024)(self._encode_query_impl)
         else:
             self.embedding_model = None
     
@@ -53,19 +92,60 @@ class DataRetrieval:
         if self.use_bm25:
             print("Đang tạo BM25 index...")
             self.tokenized_corpus = tokenized_docs
-            self.bm25 = BM25Okapi(tokenized_docs)
+            self.bm25 = SparseBM25(tokenized_docs)
             print(f"✓ Đã index {len(tokenized_docs)} documents với BM25")
         
         # Index Embedding
         if self.use_embedding:
             print("Đang tạo document embeddings...")
-            self.document_embeddings = self.embedding_model.encode(
+            # Unit-norm rows: cosine similarity = inner product
+            embeddings = self.embedding_model.encode(
                 raw_docs, 
                 show_progress_bar=True,
-                convert_to_numpy=True
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                batch_size=64
             )
+            if self.use_faiss and faiss is not None:
+                # FAISS giữ vectors (theo embedding_precision) và trả thẳng top-k
+                self._build_faiss_index(np.ascontiguousarray(embeddings, dtype=np.float32))
+                self.document_embeddings = None
+            else:
+                self.document_embeddings = compress_embeddings(embeddings, self.embedding_precision)
+                self.faiss_index = None
             print(f"✓ Đã tạo embeddings cho {len(raw_docs)} documents")
     
+    def _build_faiss_index(self, embeddings: np.ndarray):
+        """Inner-product FAISS index; IVF với nlist = sqrt(N) cho corpus lớn"""
+        n_docs, dim = embeddings.shape
+        storage = _FAISS_STORAGE.get(self.embedding_precision)
+        if storage is None:
+            raise ValueError(f"Unknown embedding precision '{self.embedding_precision}'")
+        
+        if n_docs >= _IVF_MIN_DOCS:
+            description = f"IVF{int(math.sqrt(n_docs))},{storage}"
+        else:
+            description = storage
+        
+        self.faiss_index = faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT)
+        if not self.faiss_index.is_trained:
+            self.faiss_index.train(embeddings)
+        self.faiss_index.add(embeddings)
+        if n_docs >= _IVF_MIN_DOCS:
+            faiss.extract_index_ivf(self.faiss_index).nprobe = 8
+        print(f"✓ FAISS index ({description}) cho {self.faiss_index.ntotal} documents")
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """Query embedding (1-D, unit-norm float32); query lặp lại không phải encode lại"""
+        return self._encode_query(query)
+    
+    def _encode_query_impl(self, query: str) -> np.ndarray:
+        embedding = self.embedding_model.encode(
+            [query], convert_to_numpy=True, normalize_embeddings=True
+        )[0].astype(np.float32)
+        embedding.setflags(write=False)  # Shared by every caller of the cache
+        return embedding
+    
     def retrieve_bm25(self, 
                      query_tokens: List[str], 
                      top_k: int = 10) -> List[Tuple[int, float]]:
@@ -86,7 +166,7 @@ class DataRetrieval:
         scores = self.bm25.get_scores(query_tokens)
         
         # Lấy top_k documents
-        top_indices = np.argsort(scores)[::-1][:top_k]
+        top_indices = _top_k_indices(scores, top_k)
         results = [(int(idx), float(scores[idx])) for idx in top_indices]
         
         return results
@@ -104,17 +184,22 @@ class DataRetrieval:
         Returns:
             List[Tuple[int, float]]: [(doc_id, score), ...]
         """
-        if self.document_embeddings is None:
+        if self.document_embeddings is None and self.faiss_index is None:
             raise ValueError("Embeddings chưa được tạo. Gọi index_documents() trước.")
         
         # Encode query
-        query_embedding = self.embedding_model.encode([query], convert_to_numpy=True)
+        query_embedding = self.encode_query(query)
+        
+        if self.faiss_index is not None:
+            # FAISS trả top-k trực tiếp (id -1 = IVF không đủ kết quả)
+            scores, ids = self.faiss_index.search(query_embedding[None, :], min(top_k, self.faiss_index.ntotal))
+            return [(int(idx), float(score)) for idx, score in zip(ids[0], scores[0]) if idx >= 0]
         
-        # Tính cosine similarity
-        similarities = cosine_similarity(query_embedding, self.document_embeddings)[0]
+        # Tính cosine similarity (embeddings đã normalize)
+        similarities = self.document_embeddings @ query_embedding
         
         # Lấy top_k documents
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        top_indices = _top_k_indices(similarities, top_k)
         results = [(int(idx), float(similarities[idx])) for idx in top_indices]
         
         return results
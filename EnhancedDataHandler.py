@@ -15,6 +15,7 @@ import hashlib
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 from DocumentChunker import VietnameseDocumentChunker, DocumentChunk, ChunkerFactory
+from DataHandler import read_json
 
 
 class EnhancedDataHandler:
@@ -68,8 +69,10 @@ class EnhancedDataHandler:
         # Caching
         if enable_caching:
             self.cache_dir.mkdir(exist_ok=True)
-            self._cache_file = self.cache_dir / f"chunks_{self._get_cache_key()}.pkl"
+            self.cache_key = self._get_cache_key()  # Dùng chung cho các cache phụ thuộc chunks
+            self._cache_file = self.cache_dir / f"chunks_{self.cache_key}.pkl"
         else:
+            self.cache_key = None
             self._cache_file = None
     
     def load_data(self) -> Tuple[List[Dict], List[DocumentChunk]]:
@@ -197,8 +200,7 @@ class EnhancedDataHandler:
             raise FileNotFoundError(f"File không tồn tại: {self.data_path}")
         
         try:
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                self.documents = json.load(f)
+            self.documents = read_json(self.data_path)
             
             print(f"✓ Đã load {len(self.documents)} documents từ {self.data_path}")
             
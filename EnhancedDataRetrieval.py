@@ -11,13 +11,24 @@ Chịu trách nhiệm:
 
 import numpy as np
 from typing import List, Dict, Tuple, Optional
-from rank_bm25 import BM25Okapi
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from collections import defaultdict
+import hashlib
 import math
+import sqlite3
 
 from DocumentChunker import DocumentChunk
+from SparseBM25 import SparseBM25
+from QuantizedEmbeddings import compress_embeddings
+
+
+@lru_cache(maxsize=4)
+def _load_model(model_name: str) -> SentenceTransformer:
+    """Load SentenceTransformer một lần mỗi process; các engine dùng chung weights"""
+    return SentenceTransformer(model_name)
 
 
 class EnhancedDataRetrieval:
@@ -39,7 +50,9 @@ class EnhancedDataRetrieval:
                  bm25_weight: float = 0.4,
                  embedding_weight: float = 0.6,
                  chunk_boost_factor: float = 1.2,
-                 document_aggregation: str = 'max'):  # 'max', 'mean', 'weighted_sum'
+                 document_aggregation: str = 'max',  # 'max', 'mean', 'weighted_sum'
+                 embedding_cache_path: Optional[str] = None,
+                 embedding_precision: str = 'float32'):
         """
         Args:
             embedding_model: Tên model embedding
@@ -49,6 +62,10 @@ class EnhancedDataRetrieval:
             embedding_weight: Trọng số embedding
             chunk_boost_factor: Factor boost cho chunk relevance
             document_aggregation: Cách aggregate chunk scores thành document scores
+            embedding_cache_path: File SQLite cache embeddings theo nội dung chunk;
+                None = không cache
+            embedding_precision: Kiểu lưu chunk embeddings ('float32', 'float16'
+                hoặc 'int8'; int8 nhỏ hơn 4x, score lệch ~1e-3)
         """
         self.use_bm25 = use_bm25
         self.use_embedding = use_embedding
@@ -56,6 +73,9 @@ class EnhancedDataRetrieval:
         self.embedding_weight = embedding_weight
         self.chunk_boost_factor = chunk_boost_factor
         self.document_aggregation = document_aggregation
+        self.embedding_model_name = embedding_model
+        self.embedding_cache_path = Path(embedding_cache_path) if embedding_cache_path else None
+        self.embedding_precision = embedding_precision
         
         # Ensure weights sum to 1
         total_weight = bm25_weight + embedding_weight
@@ -72,8 +92,9 @@ class EnhancedDataRetrieval:
         # Initialize embedding model
         if use_embedding:
             print(f"🤖 Loading embedding model: {embedding_model}...")
-            self.embedding_model = SentenceTransformer(embedding_model)
+            self.embedding_model = _load_model(embedding_model)
             self.chunk_embeddings = None
+            self._encode_query = lru_cache(maxsize=1024)(self._encode_query_impl)
         else:
             self.embedding_model = None
     
@@ -98,84 +119,178 @@ class EnhancedDataRetrieval:
         # Index BM25
         if self.use_bm25:
             print("  → Creating BM25 index...")
-            self.bm25 = BM25Okapi(tokenized_chunks)
+            self.bm25 = SparseBM25(tokenized_chunks)
             print(f"  ✓ BM25 indexed {len(tokenized_chunks)} chunks")
         
         # Index Embeddings
         if self.use_embedding:
             print("  → Creating chunk embeddings...")
             chunk_contents = [chunk.content for chunk in chunks]
-            self.chunk_embeddings = self.embedding_model.encode(
-                chunk_contents,
-                show_progress_bar=True,
-                convert_to_numpy=True,
-                batch_size=32
+            self.chunk_embeddings = compress_embeddings(
+                self._normalize_rows(self._load_or_encode_chunks(chunk_contents)),
+                self.embedding_precision
             )
             print(f"  ✓ Created embeddings for {len(chunk_contents)} chunks")
         
         print("✅ Chunk indexing complete!")
     
-    def retrieve_chunks(self, 
-                       query: str,
-                       query_tokens: List[str],
-                       top_k_chunks: int = 20) -> List[Tuple[DocumentChunk, float]]:
+    @staticmethod
+    def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+        """Unit-norm float32 rows: cosine similarity lúc query chỉ còn một matmul"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return np.ascontiguousarray(embeddings / np.maximum(norms, 1e-12))
+    
+    def _encode_chunks(self, chunk_contents: List[str]) -> np.ndarray:
+        # One encode call for all chunks; sentence-transformers sorts by length
+        # internally, so larger batches add little padding
+        return self.embedding_model.encode(
+            chunk_contents,
+            show_progress_bar=True,
+            convert_to_numpy=True,
+            batch_size=64
+        )
+    
+    def _load_or_encode_chunks(self, chunk_contents: List[str]) -> np.ndarray:
         """
-        Retrieve most relevant chunks
+        Chunk embeddings, chỉ encode những chunk chưa có trong cache
         
-        Args:
-            query: Query text
-            query_tokens: Tokenized query
-            top_k_chunks: Number of chunks to retrieve
+        Key = sha256(model|nội dung chunk), nên khi rebuild chỉ các chunk mới
+        hoặc đã thay đổi phải đi qua model.
+        """
+        if self.embedding_cache_path is None or not chunk_contents:
+            return self._encode_chunks(chunk_contents)
+        
+        keys = [
+            hashlib.sha256(f"{self.embedding_model_name}|{text}".encode('utf-8')).hexdigest()
+            for text in chunk_contents
+        ]
+        
+        self.embedding_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.embedding_cache_path)) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vec BLOB)')
+            
+            cached = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):  # SQLite limit on bound parameters
+                batch = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                cached.update(conn.execute(
+                    f'SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})', batch
+                ))
+            
+            missing = {}
+            for key, text in zip(keys, chunk_contents):
+                if key not in cached:
+                    missing.setdefault(key, text)
             
+            if missing:
+                new_embeddings = self._encode_chunks(list(missing.values()))
+                rows = [
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes())
+                    for key, embedding in zip(missing, new_embeddings)
+                ]
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO embeddings VALUES (?, ?)', rows)
+                cached.update(rows)
+        
+        print(f"  ✓ {len(unique_keys) - len(missing)} embeddings from cache, {len(missing)} encoded")
+        if missing:
+            print(f"💾 Cached embeddings to {self.embedding_cache_path}")
+        
+        return np.vstack([np.frombuffer(cached[key], dtype=np.float32) for key in keys])
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """Query embedding (1-D, unit-norm float32); query lặp lại không phải encode lại"""
+        return self._encode_query(query)
+    
+    def _encode_query_impl(self, query: str) -> np.ndarray:
+        embedding = self.embedding_model.encode(
+            [query], convert_to_numpy=True, normalize_embeddings=True
+        )[0].astype(np.float32)
+        embedding.setflags(write=False)  # Shared by every caller of the cache
+        return embedding
+    
+    def score_chunks(self,
+                     query: str,
+                     query_tokens: List[str]) -> Optional[np.ndarray]:
+        """
+        Boosted relevance score của mọi chunk cho query
+        
+        Tính một lần rồi truyền cho retrieve_chunks / retrieve_documents /
+        retrieve_with_context (chunk_scores=...) để nhiều view dùng chung.
+        
         Returns:
-            List[Tuple[DocumentChunk, float]]: (chunk, score) pairs
+            np.ndarray song song với self.chunks, hoặc None nếu không có
+            phương pháp scoring nào áp dụng được
         """
-        chunk_scores = {}
+        chunk_scores = np.zeros(len(self.chunks))
+        scored = False
         
         # BM25 scoring
         if self.use_bm25 and self.bm25:
             bm25_scores = self.bm25.get_scores(query_tokens)
-            max_bm25 = max(bm25_scores) if len(bm25_scores) > 0 else 1.0
+            max_bm25 = bm25_scores.max() if len(bm25_scores) > 0 else 1.0
             
             if max_bm25 > 0:
-                for i, score in enumerate(bm25_scores):
-                    normalized_score = score / max_bm25
-                    chunk_scores[i] = chunk_scores.get(i, 0) + self.bm25_weight * normalized_score
+                chunk_scores += self.bm25_weight * (bm25_scores / max_bm25)
+                scored = True
         
         # Embedding scoring
         if self.use_embedding and self.chunk_embeddings is not None:
-            query_embedding = self.embedding_model.encode([query], convert_to_numpy=True)
-            similarities = cosine_similarity(query_embedding, self.chunk_embeddings)[0]
+            # Cả hai phía đã normalize: cosine = dot product
+            similarities = self.chunk_embeddings @ self.encode_query(query)
             
-            for i, score in enumerate(similarities):
-                chunk_scores[i] = chunk_scores.get(i, 0) + self.embedding_weight * score
+            chunk_scores += self.embedding_weight * similarities
+            scored = True
+        
+        if not scored:
+            return None
         
         # Apply chunk-specific boosts
-        for chunk_idx, base_score in chunk_scores.items():
-            chunk = self.chunks[chunk_idx]
-            boosted_score = self._apply_chunk_boost(chunk, base_score, query)
-            chunk_scores[chunk_idx] = boosted_score
-        
-        # Sort và get top chunks
-        top_chunk_indices = sorted(
-            chunk_scores.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:top_k_chunks]
+        for chunk_idx, chunk in enumerate(self.chunks):
+            chunk_scores[chunk_idx] = self._apply_chunk_boost(chunk, chunk_scores[chunk_idx], query)
         
-        # Return chunks with scores
-        results = []
-        for chunk_idx, score in top_chunk_indices:
-            chunk = self.chunks[chunk_idx]
-            results.append((chunk, score))
+        return chunk_scores
+    
+    def retrieve_chunks(self, 
+                       query: str,
+                       query_tokens: List[str],
+                       top_k_chunks: int = 20,
+                       chunk_scores: Optional[np.ndarray] = None) -> List[Tuple[DocumentChunk, float]]:
+        """
+        Retrieve most relevant chunks
         
-        return results
+        Args:
+            query: Query text
+            query_tokens: Tokenized query
+            top_k_chunks: Number of chunks to retrieve
+            chunk_scores: Kết quả score_chunks() đã tính cho query này (None = tính lại)
+            
+        Returns:
+            List[Tuple[DocumentChunk, float]]: (chunk, score) pairs
+        """
+        if chunk_scores is None:
+            chunk_scores = self.score_chunks(query, query_tokens)
+        if chunk_scores is None:
+            return []
+        
+        # Top chunks: partial selection (O(N + k log k)), then sort only those
+        k = min(top_k_chunks, len(chunk_scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(chunk_scores, len(chunk_scores) - k)[len(chunk_scores) - k:]
+        top = top[np.argsort(-chunk_scores[top], kind='stable')]
+        
+        # Return chunks with scores
+        return [(self.chunks[chunk_idx], float(chunk_scores[chunk_idx])) for chunk_idx in top]
     
     def retrieve_documents(self,
                           query: str,
                           query_tokens: List[str],
                           top_k_documents: int = 10,
-                          top_k_chunks_per_search: int = 50) -> List[Tuple[int, float, List[DocumentChunk]]]:
+                          top_k_chunks_per_search: int = 50,
+                          chunk_scores: Optional[np.ndarray] = None) -> List[Tuple[int, float, List[DocumentChunk]]]:
         """
         Retrieve documents with their best chunks
         
@@ -184,6 +299,7 @@ class EnhancedDataRetrieval:
             query_tokens: Tokenized query
             top_k_documents: Number of documents to return
             top_k_chunks_per_search: Number of chunks to consider
+            chunk_scores: Kết quả score_chunks() đã tính cho query này (None = tính lại)
             
         Returns:
             List[Tuple[int, float, List[DocumentChunk]]]: (doc_id, score, best_chunks)
@@ -192,7 +308,8 @@ class EnhancedDataRetrieval:
         chunk_results = self.retrieve_chunks(
             query, 
             query_tokens, 
-            top_k_chunks_per_search
+            top_k_chunks_per_search,
+            chunk_scores=chunk_scores
         )
         
         # Group chunks by document
@@ -244,7 +361,8 @@ class EnhancedDataRetrieval:
                              query: str,
                              query_tokens: List[str],
                              top_k: int = 10,
-                             context_window: int = 1) -> List[Dict]:
+                             context_window: int = 1,
+                             chunk_scores: Optional[np.ndarray] = None) -> List[Dict]:
         """
         Retrieve với context chunks (chunks before/after)
         
@@ -253,12 +371,13 @@ class EnhancedDataRetrieval:
             query_tokens: Tokenized query
             top_k: Number of results
             context_window: Number of surrounding chunks to include
+            chunk_scores: Kết quả score_chunks() đã tính cho query này (None = tính lại)
             
         Returns:
             List[Dict]: Results with context
         """
         # Get document results
-        doc_results = self.retrieve_documents(query, query_tokens, top_k)
+        doc_results = self.retrieve_documents(query, query_tokens, top_k, chunk_scores=chunk_scores)
         
         results = []
         for doc_id, doc_score, best_chunks in doc_results:
@@ -440,8 +559,7 @@ class EnhancedDataRetrieval:
         
         # Embedding score
         if self.use_embedding and self.chunk_embeddings is not None:
-            query_embedding = self.embedding_model.encode([query], convert_to_numpy=True)
-            similarity = cosine_similarity(query_embedding, self.chunk_embeddings[chunk_idx:chunk_idx+1])[0][0]
+            similarity = float(self.chunk_embeddings[chunk_idx] @ self.encode_query(query))
             weighted_embedding = self.embedding_weight * similarity
             
             explanation['scores']['embedding_similarity'] = similarity
@@ -5,11 +5,17 @@ Advanced Search Engine với chunk-based retrieval
 Main orchestrator cho enhanced search system
 """
 
+import numpy as np
 from typing import List, Dict, Tuple, Optional
 from EnhancedDataHandler import EnhancedDataHandler, analyze_chunking_performance
 from Tokenizer import VietnameseTokenizer
 from EnhancedDataRetrieval import EnhancedDataRetrieval
+from QueryCache import QueryResultCache
 from DocumentChunker import DocumentChunk
+from pathlib import Path
+import hashlib
+import os
+import pickle
 import time
 
 
@@ -70,7 +76,9 @@ class EnhancedSearchEngine:
             bm25_weight=self.config['bm25_weight'],
             embedding_weight=self.config['embedding_weight'],
             chunk_boost_factor=self.config['chunk_boost_factor'],
-            document_aggregation=self.config['document_aggregation']
+            document_aggregation=self.config['document_aggregation'],
+            embedding_cache_path=self.config.get('embedding_cache_path'),
+            embedding_precision=self.config.get('embedding_precision', 'float32')
         )
         
         # 4. Storage
@@ -79,6 +87,16 @@ class EnhancedSearchEngine:
         self.chunk_to_doc_map = {}
         self.tokenized_chunks = []
         
+        # Cache kết quả cho query lặp lại; dùng lại kết quả của query gần giống
+        # (cosine >= threshold) chỉ khi bật 'semantic_cache'
+        self.query_cache = QueryResultCache(
+            maxsize=self.config.get('query_cache_size', 512),
+            similarity_threshold=(
+                self.config.get('semantic_cache_threshold', 0.95)
+                if self.config.get('semantic_cache', False) else None
+            )
+        )
+        
         print("\n✅ Enhanced SearchEngine initialized successfully!")
     
     def _default_config(self) -> Dict:
@@ -102,6 +120,8 @@ class EnhancedSearchEngine:
             'embedding_weight': 0.6,
             'chunk_boost_factor': 1.2,
             'document_aggregation': 'max',      # 'max', 'mean', 'weighted_sum'
+            'embedding_cache_path': './cache/embeddings.sqlite',  # Per-chunk embedding cache
+            'embedding_precision': 'float32',   # 'float16' / 'int8' to shrink chunk embeddings 2x / 4x
             
             # Search settings
             'top_k_results': 10,
@@ -117,7 +137,7 @@ class EnhancedSearchEngine:
         print("🔧 BUILDING ENHANCED SEARCH INDEX")
         print("=" * 70)
         
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         # Step 1: Load documents và create chunks
         print("\n[1/4] 📋 Loading documents and creating chunks...")
@@ -126,8 +146,7 @@ class EnhancedSearchEngine:
         
         # Step 2: Tokenize chunks
         print(f"\n[2/4] 🔤 Tokenizing {len(self.chunks)} chunks...")
-        chunk_contents = [chunk.content for chunk in self.chunks]
-        self.tokenized_chunks = self.tokenizer.tokenize_documents(chunk_contents)
+        self.tokenized_chunks = self._load_or_tokenize_chunks()
         print(f"✓ Tokenized {len(self.tokenized_chunks)} chunks")
         
         # Step 3: Index chunks
@@ -137,15 +156,52 @@ class EnhancedSearchEngine:
             tokenized_chunks=self.tokenized_chunks,
             chunk_to_doc_map=self.chunk_to_doc_map
         )
+        self.query_cache.clear()
         
         # Step 4: Performance analysis
         print(f"\n[4/4] 📊 Analyzing performance...")
         self._analyze_and_report_performance()
         
-        build_time = time.time() - start_time
+        build_time = (time.perf_counter_ns() - start_ns) / 1e9
         print(f"\n✅ Index building completed in {build_time:.2f}s")
         print("=" * 70)
     
+    def _tokenized_cache_file(self) -> Optional[Path]:
+        """Cache file của tokenized chunks, keyed by data/chunking (data handler) + tokenizer config"""
+        if not self.data_handler.cache_key:
+            return None
+        
+        config_str = f"{self.config['tokenizer_library']}_{self.config['use_stopwords']}"
+        config_hash = hashlib.md5(config_str.encode()).hexdigest()[:8]
+        return self.data_handler.cache_dir / f"tokens_{self.data_handler.cache_key}_{config_hash}.pkl"
+    
+    def _load_or_tokenize_chunks(self) -> List[List[str]]:
+        """Tokenized chunks từ cache nếu có, không thì tokenize và lưu cache"""
+        cache_file = self._tokenized_cache_file()
+        
+        if cache_file and cache_file.exists():
+            try:
+                with open(cache_file, 'rb') as f:
+                    tokenized_chunks = pickle.load(f)
+                if len(tokenized_chunks) == len(self.chunks):
+                    print("📄 Loading tokenized chunks from cache...")
+                    return tokenized_chunks
+            except Exception as e:
+                print(f"⚠️ Error loading tokenized cache: {e}")
+        
+        chunk_contents = [chunk.content for chunk in self.chunks]
+        tokenized_chunks = self.tokenizer.tokenize_documents(chunk_contents)
+        
+        if cache_file:
+            # Temp file + rename: một lần chạy bị ngắt không để lại cache dở dang
+            tmp_path = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(tokenized_chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_file)
+            print(f"💾 Cached tokenized chunks to {cache_file}")
+        
+        return tokenized_chunks
+    
     def search(self, 
               query: str, 
               top_k: int = None,
@@ -166,27 +222,88 @@ class EnhancedSearchEngine:
         if top_k is None:
             top_k = self.config['top_k_results']
         
+        # Query đã search (hoặc gần giống về nghĩa) với cùng mode: dùng lại kết quả
+        scope = (search_mode, top_k, explain)
+        embed = self.retrieval.encode_query if self.retrieval.use_embedding else None
+        cached = self.query_cache.get(query, scope, embed)
+        if cached is not None:
+            return cached
+        
         # Tokenize query
         query_tokens = self.tokenizer.tokenize(query)
         
         if search_mode == 'chunk':
-            return self._search_chunks(query, query_tokens, top_k, explain)
+            results = self._search_chunks(query, query_tokens, top_k, explain)
         elif search_mode == 'context':
-            return self._search_with_context(query, query_tokens, top_k, explain)
+            results = self._search_with_context(query, query_tokens, top_k, explain)
         else:  # document mode
-            return self._search_documents(query, query_tokens, top_k, explain)
+            results = self._search_documents(query, query_tokens, top_k, explain)
+        
+        self.query_cache.put(query, scope, results, embed)
+        return results
+    
+    def search_multi(self,
+                     query: str,
+                     top_k: int = None,
+                     modes: Tuple[str, ...] = ('document', 'chunk', 'context'),
+                     explain: bool = False) -> Dict[str, List[Dict]]:
+        """
+        Search nhiều mode cho cùng một query với một lần tokenize + scoring
+        
+        Args:
+            query: Search query
+            top_k: Number of results per mode
+            modes: Các search_mode cần trả về
+            explain: Include ranking explanations
+            
+        Returns:
+            Dict[str, List[Dict]]: search_mode -> kết quả (giống search())
+        """
+        if top_k is None:
+            top_k = self.config['top_k_results']
+        
+        embed = self.retrieval.encode_query if self.retrieval.use_embedding else None
+        searchers = {
+            'document': self._search_documents,
+            'chunk': self._search_chunks,
+            'context': self._search_with_context
+        }
+        
+        outputs = {}
+        query_tokens = None
+        chunk_scores = None
+        for mode in modes:
+            if mode not in searchers:
+                raise ValueError(f"Unknown search mode: {mode}")
+            scope = (mode, top_k, explain)
+            results = self.query_cache.get(query, scope, embed)
+            if results is None:
+                # Chỉ score chunks một lần cho mọi mode chưa có trong cache
+                if query_tokens is None:
+                    query_tokens = self.tokenizer.tokenize(query)
+                    chunk_scores = self.retrieval.score_chunks(query, query_tokens)
+                if chunk_scores is None:
+                    results = []
+                else:
+                    results = searchers[mode](query, query_tokens, top_k, explain, chunk_scores)
+                self.query_cache.put(query, scope, results, embed)
+            outputs[mode] = results
+        
+        return outputs
     
     def _search_documents(self, 
                          query: str, 
                          query_tokens: List[str], 
                          top_k: int,
-                         explain: bool = False) -> List[Dict]:
+                         explain: bool = False,
+                         chunk_scores: Optional[np.ndarray] = None) -> List[Dict]:
         """Document-level search"""
         doc_results = self.retrieval.retrieve_documents(
             query=query,
             query_tokens=query_tokens,
             top_k_documents=top_k,
-            top_k_chunks_per_search=self.config['top_k_chunks_per_search']
+            top_k_chunks_per_search=self.config['top_k_chunks_per_search'],
+            chunk_scores=chunk_scores
         )
         
         formatted_results = []
@@ -227,12 +344,14 @@ class EnhancedSearchEngine:
                       query: str, 
                       query_tokens: List[str], 
                       top_k: int,
-                      explain: bool = False) -> List[Dict]:
+                      explain: bool = False,
+                      chunk_scores: Optional[np.ndarray] = None) -> List[Dict]:
         """Chunk-level search"""
         chunk_results = self.retrieval.retrieve_chunks(
             query=query,
             query_tokens=query_tokens,
-            top_k_chunks=top_k
+            top_k_chunks=top_k,
+            chunk_scores=chunk_scores
         )
         
         formatted_results = []
@@ -265,13 +384,15 @@ class EnhancedSearchEngine:
                             query: str, 
                             query_tokens: List[str], 
                             top_k: int,
-                            explain: bool = False) -> List[Dict]:
+                            explain: bool = False,
+                            chunk_scores: Optional[np.ndarray] = None) -> List[Dict]:
         """Context-aware search"""
         context_results = self.retrieval.retrieve_with_context(
             query=query,
             query_tokens=query_tokens,
             top_k=top_k,
-            context_window=self.config['context_window']
+            context_window=self.config['context_window'],
+            chunk_scores=chunk_scores
         )
         
         formatted_results = []
@@ -385,6 +506,7 @@ class EnhancedSearchEngine:
         print("  - ':mode [document|chunk|context]' to change search mode")
         print("  - ':explain on/off' to toggle explanations")
         print("  - ':stats' to show statistics")
+        print("  - ':cache' to show query cache hits/misses")
         print("  - ':quit' to exit")
         print()
         
@@ -426,6 +548,17 @@ class EnhancedSearchEngine:
                         print(f"   Strategy: {stats['config']['chunking_strategy']}")
                         print(f"   Chunk size: {stats['config']['chunk_size']}")
                     
+                    elif user_input == ':cache':
+                        cache_stats = self.query_cache.get_stats()
+                        print(f"\n💾 Query Cache:")
+                        print(f"   Exact hits: {cache_stats['exact_hits']}")
+                        print(f"   Semantic hits: {cache_stats['semantic_hits']}")
+                        print(f"   Misses: {cache_stats['misses']}")
+                        print(f"   Cached queries: {cache_stats['size']}")
+                    
+                    else:
+                        print(f"❌ Unknown command: {user_input}")
+                    
                     continue
                 
                 if not user_input:
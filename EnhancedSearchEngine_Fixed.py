@@ -6,9 +6,38 @@ This version includes fallbacks and error handling to avoid dependency issues
 """
 
 from typing import List, Dict, Tuple, Optional
-import json
+from pathlib import Path
 import time
 import os
+import re
+import sys
+import pickle
+import hashlib
+import logging
+
+from DataHandler import read_json
+
+
+logger = logging.getLogger(__name__)
+
+# Ký tự không phải chữ/số/khoảng trắng tiếng Việt; compile một lần khi import module
+_NON_WORD = re.compile(r'[^\w\sàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]')
+
+
+def enable_console_logging(level: int = logging.INFO):
+    """
+    Hiện progress messages của engine trên stdout
+    
+    Dành cho application (main() của các scripts), gọi một lần; library code
+    không tự cấu hình logging.
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    
+    logger.setLevel(level)
 
 
 class SimpleVietnameseTokenizer:
@@ -26,8 +55,7 @@ class SimpleVietnameseTokenizer:
         """Simple tokenization"""
         # Basic cleaning
         text = text.lower()
-        import re
-        text = re.sub(r'[^\w\sàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]', ' ', text)
+        text = _NON_WORD.sub(' ', text)
         
         # Split by whitespace
         tokens = text.split()
@@ -46,6 +74,11 @@ class SimpleDocumentChunker:
     """Simple document chunker"""
     
     def __init__(self, chunk_size=256, overlap_size=32):
+        # Stride chunk_size - overlap_size phải dương
+        if overlap_size >= chunk_size:
+            raise ValueError(
+                f"overlap_size ({overlap_size}) must be smaller than chunk_size ({chunk_size})"
+            )
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
         self.tokenizer = SimpleVietnameseTokenizer(use_stopwords=False)
@@ -53,17 +86,18 @@ class SimpleDocumentChunker:
     def chunk_document(self, content: str, source_file: str) -> List[Dict]:
         """Simple chunking by word count"""
         words = content.split()
-        chunks = []
+        num_chunks = self.count_chunks(len(words))
+        chunks = [None] * num_chunks
         
-        start_idx = 0
-        chunk_idx = 0
+        # Move start position with overlap
+        stride = self.chunk_size - self.overlap_size
         
-        while start_idx < len(words):
+        for chunk_idx in range(num_chunks):
+            start_idx = chunk_idx * stride
             end_idx = min(start_idx + self.chunk_size, len(words))
-            chunk_words = words[start_idx:end_idx]
-            chunk_content = ' '.join(chunk_words)
+            chunk_content = ' '.join(words[start_idx:end_idx])
             
-            chunk = {
+            chunks[chunk_idx] = {
                 'chunk_id': f"{source_file}_{chunk_idx}",
                 'content': chunk_content,
                 'source_file': source_file,
@@ -72,23 +106,25 @@ class SimpleDocumentChunker:
                 'level': 0,
                 'metadata': {}
             }
-            
-            chunks.append(chunk)
-            
-            # Move start position with overlap
-            start_idx = end_idx - self.overlap_size
-            chunk_idx += 1
-            
-            if end_idx >= len(words):
-                break
         
         return chunks
+    
+    def count_chunks(self, num_words: int) -> int:
+        """Number of sliding-window chunks for a document of num_words words"""
+        if num_words == 0:
+            return 0
+        if num_words <= self.chunk_size:
+            return 1
+        
+        stride = self.chunk_size - self.overlap_size
+        return 1 + -(-(num_words - self.chunk_size) // stride)
 
 
 class SimpleBM25Retrieval:
     """Simple BM25-style retrieval"""
     
-    def __init__(self):
+    def __init__(self, verbose: bool = True):
+        self.verbose = verbose
         self.chunks = []
         self.tokenized_chunks = []
         self.chunk_to_doc_map = {}
@@ -98,7 +134,8 @@ class SimpleBM25Retrieval:
         self.chunks = chunks
         self.tokenized_chunks = tokenized_chunks
         self.chunk_to_doc_map = chunk_to_doc_map
-        print(f"✓ Indexed {len(chunks)} chunks for simple BM25 retrieval")
+        if self.verbose:
+            logger.info("✓ Indexed %d chunks for simple BM25 retrieval", len(chunks))
     
     def retrieve_chunks(self, query: str, query_tokens: List[str], top_k_chunks: int = 20):
         """Simple keyword-based retrieval"""
@@ -112,10 +149,45 @@ class SimpleBM25Retrieval:
         chunk_scores.sort(key=lambda x: x[1], reverse=True)
         return chunk_scores[:top_k_chunks]
     
+    def retrieve_chunks_batch(self, queries_tokens: List[List[str]], top_k_chunks: int = 20):
+        """
+        Keyword-based retrieval for many queries in one pass over the corpus
+        
+        Token counts của mỗi chunk chỉ được tính một lần và dùng chung cho tất cả queries.
+        
+        Returns:
+            List[List[Tuple[Dict, float]]]: Kết quả cho từng query, cùng thứ tự với input
+        """
+        all_chunk_scores = [[] for _ in queries_tokens]
+        
+        for chunk, tokenized_chunk in zip(self.chunks, self.tokenized_chunks):
+            chunk_token_counts = self._count_tokens(tokenized_chunk)
+            
+            for query_idx, query_tokens in enumerate(queries_tokens):
+                score = self._score_counts(query_tokens, chunk_token_counts, len(tokenized_chunk))
+                all_chunk_scores[query_idx].append((chunk, score))
+        
+        # Sort by score
+        for chunk_scores in all_chunk_scores:
+            chunk_scores.sort(key=lambda x: x[1], reverse=True)
+        
+        return [chunk_scores[:top_k_chunks] for chunk_scores in all_chunk_scores]
+    
     def retrieve_documents(self, query: str, query_tokens: List[str], top_k_documents: int = 10, top_k_chunks_per_search: int = 50):
         """Document-level retrieval"""
         chunk_results = self.retrieve_chunks(query, query_tokens, top_k_chunks_per_search)
-        
+        return self._aggregate_documents(chunk_results, top_k_documents)
+    
+    def retrieve_documents_batch(self, queries_tokens: List[List[str]], top_k_documents: int = 10, top_k_chunks_per_search: int = 50):
+        """Document-level retrieval for many queries"""
+        batch_chunk_results = self.retrieve_chunks_batch(queries_tokens, top_k_chunks_per_search)
+        return [
+            self._aggregate_documents(chunk_results, top_k_documents)
+            for chunk_results in batch_chunk_results
+        ]
+    
+    def _aggregate_documents(self, chunk_results, top_k_documents: int):
+        """Group chunk results by document (max chunk score)"""
         # Group by document
         doc_chunks = {}
         for chunk, score in chunk_results:
@@ -140,18 +212,23 @@ class SimpleBM25Retrieval:
     
     def _calculate_simple_score(self, query_tokens: List[str], chunk_tokens: List[str]) -> float:
         """Simple TF-based scoring"""
-        score = 0.0
+        chunk_token_counts = self._count_tokens(chunk_tokens)
+        return self._score_counts(query_tokens, chunk_token_counts, len(chunk_tokens))
+    
+    def _count_tokens(self, chunk_tokens: List[str]) -> Dict[str, int]:
+        """Count tokens in chunk"""
         chunk_token_counts = {}
-        
-        # Count tokens in chunk
         for token in chunk_tokens:
             chunk_token_counts[token] = chunk_token_counts.get(token, 0) + 1
-        
-        # Calculate score
+        return chunk_token_counts
+    
+    def _score_counts(self, query_tokens: List[str], chunk_token_counts: Dict[str, int], chunk_length: int) -> float:
+        """Normalized term frequency score from precomputed chunk counts"""
+        score = 0.0
         for query_token in query_tokens:
             if query_token in chunk_token_counts:
                 tf = chunk_token_counts[query_token]
-                score += tf / len(chunk_tokens)  # Normalized term frequency
+                score += tf / chunk_length  # Normalized term frequency
         
         return score
 
@@ -165,23 +242,23 @@ class FixedEnhancedSearchEngine:
         """Initialize with fallback components"""
         self.config = config or self._default_config()
         self.data_path = data_path
+        # Per-instance: verbose=False chỉ tắt progress messages của engine này
+        self.verbose = self.config.get('verbose', True)
         
-        print("=" * 70)
-        print("🚀 FIXED ENHANCED SEARCH ENGINE INITIALIZATION")
-        print("=" * 70)
+        self._log("🚀 FIXED ENHANCED SEARCH ENGINE INITIALIZATION")
         
         # Initialize simple components
-        print("\n[1/4] 📄 Initializing Simple Tokenizer...")
+        self._log("[1/4] 📄 Initializing Simple Tokenizer...")
         self.tokenizer = SimpleVietnameseTokenizer(use_stopwords=self.config['use_stopwords'])
         
-        print("\n[2/4] 🧩 Initializing Simple Chunker...")
+        self._log("[2/4] 🧩 Initializing Simple Chunker...")
         self.chunker = SimpleDocumentChunker(
             chunk_size=self.config['chunk_size'],
             overlap_size=self.config['overlap_size']
         )
         
-        print("\n[3/4] 🔍 Initializing Simple Retrieval...")
-        self.retrieval = SimpleBM25Retrieval()
+        self._log("[3/4] 🔍 Initializing Simple Retrieval...")
+        self.retrieval = SimpleBM25Retrieval(verbose=self.verbose)
         
         # Storage
         self.documents = []
@@ -189,7 +266,12 @@ class FixedEnhancedSearchEngine:
         self.chunk_to_doc_map = {}
         self.tokenized_chunks = []
         
-        print("\n✅ Fixed Enhanced SearchEngine initialized successfully!")
+        self._log("✅ Fixed Enhanced SearchEngine initialized successfully!")
+    
+    def _log(self, msg: str, *args):
+        """Progress message (logger.info) khi engine verbose"""
+        if self.verbose:
+            logger.info(msg, *args)
     
     def _default_config(self) -> Dict:
         """Default configuration"""
@@ -199,67 +281,169 @@ class FixedEnhancedSearchEngine:
             'use_stopwords': True,
             'top_k_results': 10,
             'top_k_chunks_per_search': 50,
-            'enable_caching': False  # Disabled for simplicity
+            'enable_caching': True,  # Reuse built index across runs (cache_dir)
+            'cache_dir': './cache',
+            'verbose': True  # Progress messages via logging
         }
     
-    def build_index(self):
-        """Build search index"""
-        print("\n" + "=" * 70)
-        print("🔧 BUILDING FIXED SEARCH INDEX")
-        print("=" * 70)
+    def build_index(self, documents: Optional[List[Dict]] = None):
+        """Build search index; documents: data đã parse sẵn thay vì đọc lại data_path"""
+        self._log("🔧 BUILDING FIXED SEARCH INDEX")
+        
+        start_ns = time.perf_counter_ns()
         
-        start_time = time.time()
+        # Reuse persisted index if available
+        index_path = self._get_index_cache_path(documents)
+        if index_path and index_path.exists() and self.load_index(index_path):
+            build_time = (time.perf_counter_ns() - start_ns) / 1e9
+            self._log("✅ Index loaded from cache in %.2fs", build_time)
+            return
         
         # Load documents
-        print("\n[1/4] 📋 Loading documents...")
-        with open(self.data_path, 'r', encoding='utf-8') as f:
-            self.documents = json.load(f)
-        print(f"✓ Loaded {len(self.documents)} documents")
+        self._log("[1/4] 📋 Loading documents...")
+        if documents is None:
+            documents = read_json(self.data_path)
+        self.documents = documents
+        self._log("✓ Loaded %d documents", len(self.documents))
         
         # Create chunks
-        print(f"\n[2/4] 🧩 Creating chunks...")
-        all_chunks = []
+        self._log("[2/4] 🧩 Creating chunks...")
+        chunks_per_doc = [
+            self.chunker.chunk_document(doc.get('content', ''), doc.get('filename', f'doc_{doc_id}'))
+            for doc_id, doc in enumerate(self.documents)
+        ]
+        
+        # Pre-size the flat chunk list instead of growing it chunk by chunk
+        all_chunks = [None] * sum(len(doc_chunks) for doc_chunks in chunks_per_doc)
         chunk_to_doc_map = {}
         
-        for doc_id, doc in enumerate(self.documents):
-            filename = doc.get('filename', f'doc_{doc_id}')
-            content = doc.get('content', '')
-            
-            doc_chunks = self.chunker.chunk_document(content, filename)
+        position = 0
+        for doc_id, doc_chunks in enumerate(chunks_per_doc):
+            all_chunks[position:position + len(doc_chunks)] = doc_chunks
+            position += len(doc_chunks)
             
             for chunk in doc_chunks:
                 chunk_to_doc_map[chunk['chunk_id']] = doc_id
-                all_chunks.append(chunk)
         
         self.chunks = all_chunks
         self.chunk_to_doc_map = chunk_to_doc_map
-        print(f"✓ Created {len(self.chunks)} chunks")
+        self._log("✓ Created %d chunks", len(self.chunks))
         
         # Tokenize chunks
-        print(f"\n[3/4] 🔤 Tokenizing chunks...")
+        self._log("[3/4] 🔤 Tokenizing chunks...")
         chunk_contents = [chunk['content'] for chunk in self.chunks]
         self.tokenized_chunks = self.tokenizer.tokenize_documents(chunk_contents)
-        print(f"✓ Tokenized {len(self.tokenized_chunks)} chunks")
+        self._log("✓ Tokenized %d chunks", len(self.tokenized_chunks))
         
         # Index chunks
-        print(f"\n[4/4] 🔍 Indexing chunks...")
+        self._log("[4/4] 🔍 Indexing chunks...")
         self.retrieval.index_chunks(
             chunks=self.chunks,
             tokenized_chunks=self.tokenized_chunks,
             chunk_to_doc_map=self.chunk_to_doc_map
         )
         
-        build_time = time.time() - start_time
+        build_time = (time.perf_counter_ns() - start_ns) / 1e9
         
         # Report performance
         avg_chunks_per_doc = len(self.chunks) / len(self.documents)
-        print(f"\n📊 Performance Analysis:")
-        print(f"   📋 Total chunks: {len(self.chunks)}")
-        print(f"   📄 Total documents: {len(self.documents)}")
-        print(f"   🔢 Avg chunks per doc: {avg_chunks_per_doc:.1f}")
+        self._log("📊 Performance Analysis:")
+        self._log("   📋 Total chunks: %d", len(self.chunks))
+        self._log("   📄 Total documents: %d", len(self.documents))
+        self._log("   🔢 Avg chunks per doc: %.1f", avg_chunks_per_doc)
         
-        print(f"\n✅ Index building completed in {build_time:.2f}s")
-        print("=" * 70)
+        self._log("✅ Index building completed in %.2fs", build_time)
+        
+        if index_path:
+            self.save_index(index_path)
+    
+    def save_index(self, index_path: str):
+        """
+        Persist built index to disk
+        
+        Args:
+            index_path: Đường dẫn file index
+        """
+        index_path = Path(index_path)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        index_data = {
+            'documents': self.documents,
+            'chunks': self.chunks,
+            'chunk_to_doc_map': self.chunk_to_doc_map,
+            'tokenized_chunks': self.tokenized_chunks,
+            'config': {
+                'chunk_size': self.config['chunk_size'],
+                'overlap_size': self.config['overlap_size'],
+                'use_stopwords': self.config['use_stopwords']
+            }
+        }
+        
+        # Write to a temp file then rename, so an interrupted run or a parallel
+        # script never sees a half-written index
+        tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(index_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+        
+        self._log("💾 Saved index to %s", index_path)
+    
+    def load_index(self, index_path: str) -> bool:
+        """
+        Load index previously saved by save_index()
+        
+        Args:
+            index_path: Đường dẫn file index
+            
+        Returns:
+            bool: True nếu load thành công
+        """
+        try:
+            with open(index_path, 'rb') as f:
+                index_data = pickle.load(f)
+            
+            self.documents = index_data['documents']
+            self.chunks = index_data['chunks']
+            self.chunk_to_doc_map = index_data['chunk_to_doc_map']
+            self.tokenized_chunks = index_data['tokenized_chunks']
+            
+        except Exception as e:
+            logger.warning("⚠️ Error loading index: %s", e)
+            return False
+        
+        self.retrieval.index_chunks(
+            chunks=self.chunks,
+            tokenized_chunks=self.tokenized_chunks,
+            chunk_to_doc_map=self.chunk_to_doc_map
+        )
+        self._log("📄 Loaded %d documents và %d chunks from %s", len(self.documents), len(self.chunks), index_path)
+        return True
+    
+    def _get_index_cache_path(self, documents: Optional[List[Dict]] = None) -> Optional[Path]:
+        """
+        Cache path keyed by index config and by the data: the documents passed
+        to build_index (content hash), or else the data file (path, mtime, size)
+        """
+        if not self.config.get('enable_caching', False):
+            return None
+        
+        if documents is not None:
+            # Documents truyền vào có thể khác data file: key theo nội dung
+            file_hash = hashlib.md5(
+                pickle.dumps(documents, protocol=pickle.HIGHEST_PROTOCOL)
+            ).hexdigest()[:8]
+        else:
+            # stat() thay vì hash nội dung: warm path không phải đọc cả data file
+            data_path = Path(self.data_path).resolve()
+            stat = data_path.stat()
+            file_key = f"{data_path}_{stat.st_mtime_ns}_{stat.st_size}"
+            file_hash = hashlib.md5(file_key.encode()).hexdigest()[:8]
+        
+        config_str = f"{self.config['chunk_size']}_{self.config['overlap_size']}_{self.config['use_stopwords']}"
+        config_hash = hashlib.md5(config_str.encode()).hexdigest()[:8]
+        
+        cache_dir = Path(self.config.get('cache_dir', './cache'))
+        return cache_dir / f"fixed_index_{file_hash}_{config_hash}.pkl"
     
     def search(self, query: str, top_k: int = None, search_mode: str = 'document') -> List[Dict]:
         """Enhanced search"""
@@ -273,6 +457,36 @@ class FixedEnhancedSearchEngine:
         else:  # document mode
             return self._search_documents(query, query_tokens, top_k)
     
+    def search_batch(self, queries: List[str], top_k: int = None, search_mode: str = 'document') -> List[List[Dict]]:
+        """
+        Search many queries at once (throughput mode)
+        
+        Queries được tokenize cùng lúc và chấm điểm trong một lượt duyệt corpus.
+        
+        Args:
+            queries: Danh sách queries
+            top_k: Số kết quả cho mỗi query
+            search_mode: 'document' hoặc 'chunk'
+            
+        Returns:
+            List[List[Dict]]: Kết quả cho từng query, cùng thứ tự với input
+        """
+        if top_k is None:
+            top_k = self.config['top_k_results']
+        
+        queries_tokens = self.tokenizer.tokenize_documents(queries)
+        
+        if search_mode == 'chunk':
+            batch_results = self.retrieval.retrieve_chunks_batch(queries_tokens, top_k_chunks=top_k)
+            return [self._format_chunk_results(chunk_results) for chunk_results in batch_results]
+        else:  # document mode
+            batch_results = self.retrieval.retrieve_documents_batch(
+                queries_tokens,
+                top_k_documents=top_k,
+                top_k_chunks_per_search=self.config['top_k_chunks_per_search']
+            )
+            return [self._format_document_results(doc_results) for doc_results in batch_results]
+    
     def _search_documents(self, query: str, query_tokens: List[str], top_k: int) -> List[Dict]:
         """Document-level search"""
         doc_results = self.retrieval.retrieve_documents(
@@ -281,7 +495,10 @@ class FixedEnhancedSearchEngine:
             top_k_documents=top_k,
             top_k_chunks_per_search=self.config['top_k_chunks_per_search']
         )
-        
+        return self._format_document_results(doc_results)
+    
+    def _format_document_results(self, doc_results) -> List[Dict]:
+        """Format (doc_id, score, best_chunks) tuples"""
         formatted_results = []
         for doc_id, score, best_chunks in doc_results:
             doc = self.documents[doc_id]
@@ -312,7 +529,10 @@ class FixedEnhancedSearchEngine:
             query_tokens=query_tokens,
             top_k_chunks=top_k
         )
-        
+        return self._format_chunk_results(chunk_results)
+    
+    def _format_chunk_results(self, chunk_results) -> List[Dict]:
+        """Format (chunk, score) pairs"""
         formatted_results = []
         for chunk, score in chunk_results:
             doc_id = self.chunk_to_doc_map.get(chunk['chunk_id'])
@@ -387,6 +607,11 @@ class FixedEnhancedSearchEngine:
                         print("❌ Valid modes: document, chunk")
                     continue
                 
+                # Typo'd commands are not queries
+                if user_input.startswith(':'):
+                    print(f"❌ Unknown command: {user_input}")
+                    continue
+                
                 if not user_input:
                     continue
                 
@@ -411,13 +636,24 @@ class FixedEnhancedSearchEngine:
 def main():
     """Main function"""
     DATA_PATH = "data_content.json"
+    enable_console_logging()
     
     if not os.path.exists(DATA_PATH):
         print(f"❌ Data file not found: {DATA_PATH}")
         return
     
-    # Initialize fixed engine
-    engine = FixedEnhancedSearchEngine(DATA_PATH)
+    config = {
+        'chunk_size': 256,
+        'overlap_size': 32,
+        'use_stopwords': True,
+        'top_k_results': 10,
+        'top_k_chunks_per_search': 50,
+        'enable_caching': True,  # Reload persisted index on later runs
+        'cache_dir': './cache'
+    }
+    
+    # Initialize fixed engine (build_index reuses cached index if present)
+    engine = FixedEnhancedSearchEngine(DATA_PATH, config)
     engine.build_index()
     
     # Start interactive search
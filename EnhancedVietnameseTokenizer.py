@@ -9,13 +9,120 @@ Improvements:
 4. Better handling of Vietnamese linguistic features
 """
 
+import os
 import re
+import sys
 import unicodedata
-from typing import List, Set, Dict, Tuple
-from underthesea import word_tokenize, pos_tag, ner
-from pyvi import ViTokenizer
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Set, Dict, Tuple, Optional
 import json
 
+# `regex` hỗ trợ possessive quantifiers trên mọi Python 3 (stdlib re chỉ từ 3.11)
+try:
+    import regex as _re_entity
+except ImportError:
+    _re_entity = None
+
+
+# Vietnamese linguistic patterns, compiled once and shared by all tokenizer instances.
+# Possessive quantifiers (++, *+) never give back characters, so a failed
+# match cannot backtrack through long runs of letters/whitespace. Without
+# `regex` the patterns fall back to their greedy form under stdlib re.
+_POSSESSIVE_MARK = re.compile(r'(?<=[+*}])\+')
+
+
+def _compile_entity(pattern: str, flags: int = 0):
+    """Compile possessive pattern bằng `regex`, hoặc bản greedy bằng stdlib re"""
+    if _re_entity is not None:
+        return _re_entity.compile(pattern, flags)
+    return re.compile(_POSSESSIVE_MARK.sub('', pattern), flags)
+
+
+# Vietnamese letter classes shared by the entity patterns: a name starts with a
+# Vietnamese letter and continues over Vietnamese letters and whitespace
+_VI_UPPER = r'[A-ZÁÀẢÃẠÂẦẤẨẪẬĂẰẮẲẴẶÊỀẾỂỄỆÔỒỐỔỖỘƠỜỚỞỠỢƯỪỨỬỮỰÝỲỶỸỴĐ]'
+_VI_LOWER_OR_SPACE = r'[a-záàảãạâầấẩẫậăằắẳẵặêềếểễệôồốổỗộơờớởỡợưừứửữựýỳỷỹỵđ\s]'
+_VI_NAME = _VI_UPPER + _VI_LOWER_OR_SPACE + '++'
+
+_VIETNAMESE_PATTERNS = {
+    # Patterns để nhận diện entities quan trọng
+    'person_title': _compile_entity(r'\b(ông|bà|anh|chị|em|đức|hoàng|vua|chúa|tướng|đại_tướng)\s++(' + _VI_NAME + r')', re.IGNORECASE),
+    
+    # Geographic entities
+    'location': _compile_entity(r'\b(thành_phố|tỉnh|huyện|xã|thôn|làng|quận|phường|thị_trấn|quốc_gia)\s++(' + _VI_NAME + r')', re.IGNORECASE),
+    
+    # Historical periods/events
+    'historical_period': _compile_entity(r'\b(thời|thời_kỳ|thời_đại|niên_đại|năm|triều_đại|vương_triều)\s++(' + _VI_NAME + r')', re.IGNORECASE),
+    
+    # Years and dates
+    'year': _compile_entity(r'\b(năm|tháng)\s*+(\d{1,4}+)\b'),
+    'date_range': _compile_entity(r'\b(\d{1,4}+)\s*+[-–—]\s*+(\d{1,4}+)\b'),
+    
+    # Vietnamese compound words (connected by underscore): a whole word with an
+    # inner '_', checked by lookahead so the word itself is consumed atomically
+    'compound_word': _compile_entity(r'\b(?=\w+_\w)\w++')
+}
+
+# Output category of extract_important_entities -> pattern key, in scan order
+_ENTITY_CATEGORIES = [
+    ('persons', 'person_title'),
+    ('locations', 'location'),
+    ('historical_periods', 'historical_period'),
+    ('years', 'year'),
+    ('compound_words', 'compound_word'),
+]
+
+# Markdown normalization: all markers stripped in one alternation pass.
+# Each alternative captures the content to keep; headers keep nothing.
+_MD_ALL = re.compile(
+    r'(?P<header>^#{1,6}\s+)'                     # # header
+    r'|\*\*(?P<bold_star>.*?)\*\*'                # **bold**
+    r'|\*(?P<italic_star>.*?)\*'                  # *italic*
+    r'|__(?P<bold_under>.*?)__'                   # __bold__
+    r'|_(?P<italic_under>.*?)_'                   # _italic_
+    r'|`(?P<code>.*?)`'                           # `code`
+    r'|\[(?P<link>[^\]]+)\]\([^\)]+\)',           # [text](url)
+    re.MULTILINE
+)
+_WS = re.compile(r'\s+')
+# Characters that can start a markdown marker (cheap substring probe before _MD_ALL)
+_MD_TRIGGERS = '#*_`['
+
+# Sentinel joining documents for batched word segmentation in tokenize_documents
+_DOC_SEPARATOR = 'xxdocsepxx'
+
+# Single-character markdown symbols counted by get_stopwords_stats
+_MARKDOWN_SYMBOLS = frozenset({'#', '*', '_', '`', '>', '|', '[', ']', '(', ')'})
+
+
+def _strip_markdown_match(match: re.Match) -> str:
+    """Replacement for _MD_ALL: keep the inner text of the matched marker"""
+    if match.lastgroup == 'header':
+        return ''
+    return match.group(match.lastgroup) or ''
+
+
+@lru_cache(maxsize=1)
+def _get_underthesea():
+    """Load and warm up underthesea word_tokenize once per process"""
+    from underthesea import word_tokenize
+    word_tokenize('warmup')
+    return word_tokenize
+
+
+@lru_cache(maxsize=1)
+def _get_coccoc():
+    """Load the Cốc Cốc C++ tokenizer (dictionaries) once per process"""
+    from CocCocTokenizer import PyTokenizer
+    return PyTokenizer(load_nontone_data=True)
+
+
+@lru_cache(maxsize=1)
+def _warn_coccoc_missing():
+    """Fallback warning, printed once per process rather than per tokenizer"""
+    print("⚠️ CocCocTokenizer not installed, falling back to pyvi")
+
 
 class EnhancedVietnameseTokenizer:
     """
@@ -38,7 +145,7 @@ class EnhancedVietnameseTokenizer:
         """
         Args:
             use_stopwords: Sử dụng stopwords filtering
-            library: 'underthesea' hoặc 'pyvi'  
+            library: 'underthesea', 'pyvi' hoặc 'coccoc' (C++, fallback về pyvi nếu chưa cài)
             enable_ner: Bật Named Entity Recognition
             enable_pos: Bật POS tagging
             preserve_entities: Giữ lại named entities (tên người, địa danh)
@@ -50,12 +157,43 @@ class EnhancedVietnameseTokenizer:
         self.preserve_entities = preserve_entities
         
         # Load comprehensive stopwords
-        self.stopwords = self._load_comprehensive_stopwords() if use_stopwords else set()
+        self.stopwords = self._load_comprehensive_stopwords() if use_stopwords else frozenset()
+        self._categorize_stopwords()
         
         # Vietnamese linguistic patterns
         self.vietnamese_patterns = self._init_vietnamese_patterns()
         
-    def _load_comprehensive_stopwords(self) -> Set[str]:
+        # Cốc Cốc tokenizer is optional: fall back to pyvi when it is not installed
+        if library == 'coccoc':
+            try:
+                _get_coccoc()
+            except ImportError:
+                _warn_coccoc_missing()
+                self.library = library = 'pyvi'
+        
+        # Keep the segmentation model warm for ad-hoc (query-time) tokenize calls
+        if library == 'underthesea':
+            _get_underthesea()
+        
+        self._init_caches()
+    
+    def _init_caches(self):
+        """Per-instance LRU caches (repeated headers/boilerplate, repeated queries)"""
+        self._cached_tok = lru_cache(maxsize=4096)(self._tokenize_impl)
+        self._norm_cache = lru_cache(maxsize=8192)(self._normalize_impl)
+    
+    def __getstate__(self):
+        # lru_cache wrappers of bound methods are not picklable (process pool)
+        state = self.__dict__.copy()
+        state.pop('_cached_tok', None)
+        state.pop('_norm_cache', None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_caches()
+        
+    def _load_comprehensive_stopwords(self) -> frozenset:
         """
         Load comprehensive Vietnamese stopwords list (300+ words)
         
@@ -138,52 +276,37 @@ class EnhancedVietnameseTokenizer:
             'i', 'ii', 'iii', 'iv', 'v', 'vi', 'vii', 'viii', 'ix', 'x'
         }
         
-        return vietnamese_stopwords
+        # Interned so lookups of interned tokens short-circuit on identity
+        return frozenset(sys.intern(word) for word in vietnamese_stopwords)
+    
+    def _categorize_stopwords(self):
+        """Precompute stopword categories used by get_stopwords_stats"""
+        ascii_lower = set('abcdefghijklmnopqrstuvwxyz')
+        self._en_mixed = frozenset(w for w in self.stopwords if not ascii_lower.isdisjoint(w))
+        self._vi_core = self.stopwords - self._en_mixed
+        self._md_symbols = self.stopwords & _MARKDOWN_SYMBOLS
     
     def _init_vietnamese_patterns(self) -> Dict[str, re.Pattern]:
-        """Initialize Vietnamese-specific regex patterns"""
-        patterns = {
-            # Patterns để nhận diện entities quan trọng
-            'person_title': re.compile(r'\b(ông|bà|anh|chị|em|đức|hoàng|vua|chúa|tướng|đại_tướng)\s+([A-ZÁÀẢÃẠÂẦẤẨẪẬĂẰẮẲẴẶÊỀẾỂỄỆÔỒỐỔỖỘƠỜỚỞỠỢƯỪỨỬỮỰÝỲỶỸỴĐ][a-záàảãạâầấẩẫậăằắẳẵặêềếểễệôồốổỗộơờớởỡợưừứửữựýỳỷỹỵđ\s]+)', re.IGNORECASE),
-            
-            # Geographic entities
-            'location': re.compile(r'\b(thành_phố|tỉnh|huyện|xã|thôn|làng|quận|phường|thị_trấn|quốc_gia)\s+([A-ZÁÀẢÃẠÂẦẤẨẪẬĂẰẮẲẴẶÊỀẾỂỄỆÔỒỐỔỖỘƠỜỚỞỠỢƯỪỨỬỮỰÝỲỶỸỴĐ][a-záàảãạâầấẩẫậăằắẳẵặêềếểễệôồốổỗộơờớởỡợưừứửữựýỳỷỹỵđ\s]+)', re.IGNORECASE),
-            
-            # Historical periods/events
-            'historical_period': re.compile(r'\b(thời|thời_kỳ|thời_đại|niên_đại|năm|triều_đại|vương_triều)\s+([A-ZÁÀẢÃẠÂẦẤẨẪẬĂẰẮẲẴẶÊỀẾỂỄỆÔỒỐỔỖỘƠỜỚỞỠỢƯỪỨỬỮỰÝỲỶỸỴĐ][a-záàảãạâầấẩẫậăằắẳẵặêềếểễệôồốổỗộơờớởỡợưừứửữựýỳỷỹỵđ\s]+)', re.IGNORECASE),
-            
-            # Years and dates
-            'year': re.compile(r'\b(năm|tháng)\s*(\d{1,4})\b'),
-            'date_range': re.compile(r'\b(\d{1,4})\s*[-–—]\s*(\d{1,4})\b'),
-            
-            # Vietnamese compound words (connected by underscore)
-            'compound_word': re.compile(r'\b\w+(_\w+)+\b')
-        }
-        
-        return patterns
+        """Vietnamese-specific regex patterns (compiled once at module level)"""
+        return _VIETNAMESE_PATTERNS
     
     def normalize_text(self, text: str) -> str:
         """
         Enhanced normalization cho Vietnamese text
         """
+        return self._norm_cache(text)
+    
+    def _normalize_impl(self, text: str) -> str:
+        """normalize_text body behind the LRU cache"""
         # Unicode normalization
         text = unicodedata.normalize('NFC', text)
         
-        # Convert markdown headers to regular text
-        text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-        
-        # Remove markdown formatting but preserve content
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # **bold**
-        text = re.sub(r'\*(.*?)\*', r'\1', text)      # *italic*
-        text = re.sub(r'__(.*?)__', r'\1', text)        # __bold__
-        text = re.sub(r'_(.*?)_', r'\1', text)          # _italic_
-        text = re.sub(r'`(.*?)`', r'\1', text)          # `code`
-        
-        # Remove markdown links but keep text
-        text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+        # Strip markdown headers, formatting and links but keep their text
+        if any(ch in text for ch in _MD_TRIGGERS):
+            text = _MD_ALL.sub(_strip_markdown_match, text)
         
         # Clean up extra whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WS.sub(' ', text).strip()
         
         return text
     
@@ -202,24 +325,17 @@ class EnhancedVietnameseTokenizer:
             'compound_words': []
         }
         
-        # Extract using patterns
-        for match in self.vietnamese_patterns['person_title'].finditer(text):
-            entities['persons'].append(match.group(0).strip())
-            
-        for match in self.vietnamese_patterns['location'].finditer(text):
-            entities['locations'].append(match.group(0).strip())
-            
-        for match in self.vietnamese_patterns['historical_period'].finditer(text):
-            entities['historical_periods'].append(match.group(0).strip())
-            
-        for match in self.vietnamese_patterns['year'].finditer(text):
-            entities['years'].append(match.group(0).strip())
-            
-        for match in self.vietnamese_patterns['compound_word'].finditer(text):
-            entities['compound_words'].append(match.group(0).strip())
+        # Extract using patterns: mỗi category scan riêng, vì entities của các
+        # category có thể chồng nhau (vd. 'năm 1890' nằm trong span của person)
+        for category, key in _ENTITY_CATEGORIES:
+            if key == 'compound_word' and '_' not in text:
+                continue  # Compound words cần có '_'
+            for match in _VIETNAMESE_PATTERNS[key].finditer(text):
+                entities[category].append(match.group(0).strip())
         
         # Use underthesea NER if enabled
         if self.enable_ner:
+            from underthesea import ner
             try:
                 ner_result = ner(text)
                 for token, tag in ner_result:
@@ -249,39 +365,44 @@ class EnhancedVietnameseTokenizer:
         lower_text = normalized_text.lower()
         
         # Tokenize based on library
+        tokens = self._segment(lower_text)
+        
+        tokens = self._filter_tokens(tokens, entities)
+        
+        return tokens, entities
+    
+    def _segment(self, lower_text: str) -> List[str]:
+        """Word segmentation with the configured library"""
         if self.library == 'underthesea':
-            tokens = word_tokenize(lower_text, format="text").split()
+            # List output skips the text join + split round-trip; multi-syllable
+            # words come back space-separated, so join them with '_' like format="text"
+            return [token.replace(' ', '_') for token in _get_underthesea()(lower_text)]
         elif self.library == 'pyvi':
-            tokens = ViTokenizer.tokenize(lower_text).split()
+            from pyvi import ViTokenizer
+            return ViTokenizer.tokenize(lower_text).split()
+        elif self.library == 'coccoc':
+            return _get_coccoc().word_tokenize(lower_text, tokenize_option=0)
         else:
-            tokens = lower_text.split()
-        
-        # Remove stopwords but preserve important entities
-        if self.use_stopwords:
-            preserved_tokens = []
-            for token in tokens:
-                # Keep token if it's part of an important entity
-                should_preserve = False
-                
-                if self.preserve_entities:
-                    for entity_list in entities.values():
-                        for entity in entity_list:
-                            if token in entity.lower():
-                                should_preserve = True
-                                break
-                        if should_preserve:
-                            break
-                
-                # Keep if not a stopword or if it's an important entity
-                if token not in self.stopwords or should_preserve:
-                    preserved_tokens.append(token)
-            
-            tokens = preserved_tokens
-        
-        # Remove very short tokens (< 2 chars) unless they're numbers
-        tokens = [token for token in tokens if len(token) >= 2 or token.isdigit()]
+            return lower_text.split()
+    
+    def _filter_tokens(self, tokens: List[str], entities: Dict[str, List[str]]) -> List[str]:
+        """Remove stopwords (except preserved entity words) and very short tokens"""
+        # Words of important entities are kept even if they are stopwords
+        preserved_words = set()
+        if self.use_stopwords and self.preserve_entities:
+            for entity_list in entities.values():
+                for entity in entity_list:
+                    preserved_words.update(entity.lower().split())
         
-        return tokens, entities
+        # Remove stopwords (except preserved entity words) and very short tokens
+        # (< 2 chars) unless they're numbers, in a single pass. Tokens are interned:
+        # repeated words share one string object (and its cached hash)
+        stopwords = self.stopwords
+        return [
+            token for token in map(sys.intern, tokens)
+            if (token not in stopwords or token in preserved_words)
+            and (len(token) >= 2 or token.isdigit())
+        ]
     
     def tokenize(self, text: str, return_entities: bool = False) -> List[str]:
         """
@@ -294,24 +415,96 @@ class EnhancedVietnameseTokenizer:
         Returns:
             List of tokens, or tuple (tokens, entities) if return_entities=True
         """
-        tokens, entities = self.tokenize_with_context(text)
+        if not return_entities:
+            return list(self._cached_tok(text))
         
-        if return_entities:
-            return tokens, entities
-        else:
-            return tokens
+        return self.tokenize_with_context(text)
+    
+    def segment(self, text: str) -> List[str]:
+        """Normalize + lowercase + word segmentation, chưa lọc stopwords"""
+        return self._segment(self.normalize_text(text).lower())
+
+    def tokenize_presegmented(self, tokens: List[str], text: Optional[str] = None) -> List[str]:
+        """
+        Lọc stopwords trên tokens đã segment sẵn (không gọi lại underthesea/pyvi)
+
+        Khi nhiều tokenizer cùng library (khác stopwords / entity settings) chạy
+        trên một văn bản: segment() một lần, rồi gọi hàm này cho từng tokenizer.
+
+        Args:
+            tokens: Output của segment()
+            text: Raw text, để extract entities cần preserve (None = không preserve)
+        """
+        entities = self.extract_important_entities(self.normalize_text(text)) if text else {}
+        return self._filter_tokens(tokens, entities)
+
+    def _tokenize_impl(self, text: str) -> Tuple[str, ...]:
+        """Tokenize body behind the LRU cache (tuple so cached output is immutable)"""
+        tokens, _ = self.tokenize_with_context(text)
+        return tuple(tokens)
     
-    def tokenize_documents(self, documents: List[str]) -> List[List[str]]:
-        """Enhanced document tokenization với context awareness"""
-        return [self.tokenize(doc) for doc in documents]
+    def tokenize_documents(self, documents: List[str], n_workers: Optional[int] = 1) -> List[List[str]]:
+        """
+        Enhanced document tokenization với context awareness
+        
+        Args:
+            documents: Danh sách documents
+            n_workers: Số process song song (1 = không dùng process pool,
+                None = os.cpu_count())
+        """
+        n_workers = n_workers or os.cpu_count() or 1
+        if n_workers <= 1 or len(documents) < 2 * n_workers:
+            return self._tokenize_batch(documents)
+        
+        # Contiguous slices, several per worker to balance uneven document lengths
+        num_batches = n_workers * 4
+        batch_size = -(-len(documents) // num_batches)
+        batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+        
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = executor.map(self._tokenize_batch, batches)
+            return [tokens for batch_tokens in results for tokens in batch_tokens]
+    
+    def _tokenize_batch(self, documents: List[str]) -> List[List[str]]:
+        """
+        Tokenize a list of documents in the current process
+        
+        Tất cả documents được nối bằng một sentinel và segment trong một lần gọi
+        underthesea/pyvi, sau đó tách lại theo sentinel. Entities và stopword
+        filtering vẫn được xử lý riêng cho từng document.
+        """
+        if len(documents) <= 1:
+            return [self.tokenize(doc) for doc in documents]
+        
+        normalized_docs = [self.normalize_text(doc) for doc in documents]
+        entities_per_doc = [self.extract_important_entities(doc) for doc in normalized_docs]
+        
+        # Punctuation around the sentinel keeps it from merging into a compound word
+        joined = f' . {_DOC_SEPARATOR} . '.join(doc.lower() for doc in normalized_docs)
+        
+        tokens_per_doc = [[]]
+        for token in self._segment(joined):
+            if token == _DOC_SEPARATOR:
+                tokens_per_doc.append([])
+            else:
+                tokens_per_doc[-1].append(token)
+        
+        # Segmenter altered the sentinel: fall back to one call per document
+        if len(tokens_per_doc) != len(documents):
+            return [self.tokenize(doc) for doc in documents]
+        
+        return [
+            self._filter_tokens(tokens, entities)
+            for tokens, entities in zip(tokens_per_doc, entities_per_doc)
+        ]
     
     def get_stopwords_stats(self) -> Dict[str, int]:
         """Get statistics about stopwords"""
         return {
             'total_stopwords': len(self.stopwords),
-            'vietnamese_core': len([w for w in self.stopwords if not any(c in 'abcdefghijklmnopqrstuvwxyz' for c in w)]),
-            'english_mixed': len([w for w in self.stopwords if any(c in 'abcdefghijklmnopqrstuvwxyz' for c in w)]),
-            'markdown_symbols': len([w for w in self.stopwords if w in {'#', '*', '_', '`', '>', '|', '[', ']', '(', ')'}])
+            'vietnamese_core': len(self._vi_core),
+            'english_mixed': len(self._en_mixed),
+            'markdown_symbols': len(self._md_symbols)
         }
 
 
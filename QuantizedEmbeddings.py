@@ -0,0 +1,85 @@
+"""
+QuantizedEmbeddings.py
+Lưu embedding matrix ở int8 / float16 để giảm bộ nhớ khi search
+"""
+
+import numpy as np
+from typing import Union
+
+
+EMBEDDING_PRECISIONS = ('float32', 'float16', 'int8')
+
+
+class QuantizedEmbeddings:
+    """
+    Embedding matrix nén (int8 với scale theo từng row, hoặc float16)
+
+    Dùng thay cho ndarray float32 ở những chỗ chỉ cần `embeddings @ query`
+    và `embeddings[i]`: int8 nhỏ hơn 4x, float16 nhỏ hơn 2x. NumPy không có
+    GEMV cho int8/float16, nên matmul giải nén từng block rows sang float32
+    (bộ nhớ tạm bị chặn bởi block_rows, không phải cả matrix).
+    """
+
+    def __init__(self, embeddings: np.ndarray, precision: str = 'int8', block_rows: int = 8192):
+        if precision not in ('float16', 'int8'):
+            raise ValueError(f"Unsupported embedding precision: {precision}")
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.precision = precision
+        self.block_rows = block_rows
+        self.shape = embeddings.shape
+
+        if precision == 'int8':
+            # Symmetric per-row scale: max |x| của mỗi row map về 127
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.data = np.round(embeddings / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        else:
+            self.data = embeddings.astype(np.float16)
+            self.scales = None
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _dequantize(self, start: int, stop: int) -> np.ndarray:
+        block = self.data[start:stop].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:stop, None]
+        return block
+
+    def __getitem__(self, index: Union[int, slice]) -> np.ndarray:
+        """Row(s) đã giải nén sang float32"""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self._dequantize(start, stop)[::step]
+        index = range(len(self))[index]  # Negative index + IndexError như ndarray
+        return self._dequantize(index, index + 1)[0]
+
+    def __matmul__(self, query: np.ndarray) -> np.ndarray:
+        """Scores (N,) = embeddings @ query, tính theo từng block rows"""
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            stop = min(start + self.block_rows, len(self))
+            # int8: (q_rows @ query) * scale == dequantized rows @ query
+            block = self.data[start:stop].astype(np.float32)
+            scores[start:stop] = block @ query
+            if self.scales is not None:
+                scores[start:stop] *= self.scales[start:stop]
+        return scores
+
+
+def compress_embeddings(embeddings: np.ndarray, precision: str = 'float32'):
+    """ndarray float32 (precision='float32') hoặc QuantizedEmbeddings"""
+    if precision not in EMBEDDING_PRECISIONS:
+        raise ValueError(
+            f"Unknown embedding precision '{precision}', expected one of {EMBEDDING_PRECISIONS}"
+        )
+    if precision == 'float32':
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    return QuantizedEmbeddings(embeddings, precision)
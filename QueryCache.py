@@ -0,0 +1,124 @@
+"""
+QueryCache.py
+Cache kết quả search theo query
+
+Chịu trách nhiệm:
+- Exact match: query đã chuẩn hóa (lowercase, gộp khoảng trắng)
+- Semantic match (opt-in): query embedding gần với một query đã cache (cosine >= threshold)
+- LRU eviction và thống kê hit/miss
+"""
+
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class QueryResultCache:
+    """
+    Two-tier LRU cache cho kết quả search
+
+    Mỗi entry thuộc một scope (vd. (search_mode, top_k)): kết quả chỉ được dùng
+    lại cho query cùng scope. Kết quả trả về là object đã cache, caller không
+    được sửa trực tiếp.
+    """
+
+    def __init__(self, maxsize: int = 512, similarity_threshold: Optional[float] = None):
+        """
+        Args:
+            maxsize: Số query tối đa giữ trong cache
+            similarity_threshold: Cosine tối thiểu giữa hai query embeddings để
+                dùng lại kết quả; None (mặc định) = chỉ exact match. Query gần
+                giống nhưng khác ý (vd. 'sinh năm nào' / 'mất năm nào') có thể
+                vượt threshold, nên chỉ bật khi chấp nhận điều đó
+        """
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+
+        # (normalized query, scope) -> (results, vector slot or None)
+        self._entries: OrderedDict = OrderedDict()
+        # Normalized query embeddings, one row per slot (allocated on first put)
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[tuple]] = [None] * maxsize
+        self._free_slots = list(range(maxsize - 1, -1, -1))
+
+        self.stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, query: str, scope: Hashable,
+            embed: Optional[Callable[[str], np.ndarray]] = None) -> Optional[List[Dict]]:
+        """
+        Kết quả đã cache cho query, hoặc None
+
+        Args:
+            query: Query text
+            scope: Những tham số khác của search (mode, top_k, ...)
+            embed: Hàm encode query; chỉ được gọi khi không có exact match
+        """
+        key = (self._normalize(query), scope)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats['exact_hits'] += 1
+            return entry[0]
+
+        if embed is not None and self.similarity_threshold is not None and self._vectors is not None:
+            slots = [
+                slot for slot, slot_key in enumerate(self._slot_keys)
+                if slot_key is not None and slot_key[1] == scope
+            ]
+            if slots:
+                similarities = self._vectors[slots] @ self._unit(embed(query))
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    match = self._slot_keys[slots[best]]
+                    self._entries.move_to_end(match)
+                    self.stats['semantic_hits'] += 1
+                    return self._entries[match][0]
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, query: str, scope: Hashable, results: List[Dict],
+            embed: Optional[Callable[[str], np.ndarray]] = None):
+        """Lưu kết quả của query; embed = hàm encode query (None = chỉ exact match)"""
+        key = (self._normalize(query), scope)
+        if key in self._entries:
+            self._release(self._entries.pop(key)[1])
+        elif len(self._entries) >= self.maxsize:
+            _, (_, slot) = self._entries.popitem(last=False)
+            self._release(slot)
+
+        slot = None
+        if embed is not None and self.similarity_threshold is not None:
+            vector = self._unit(embed(query))
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._slot_keys[slot] = key
+
+        self._entries[key] = (results, slot)
+
+    def _release(self, slot: Optional[int]):
+        if slot is not None:
+            self._slot_keys[slot] = None
+            self._free_slots.append(slot)
+
+    def clear(self):
+        """Xóa toàn bộ cache (vd. sau khi rebuild index)"""
+        self._entries.clear()
+        self._slot_keys = [None] * self.maxsize
+        self._free_slots = list(range(self.maxsize - 1, -1, -1))
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss counts và số query đang cache"""
+        return {**self.stats, 'size': len(self._entries)}
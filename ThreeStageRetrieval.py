@@ -13,14 +13,67 @@ and adding dedicated reranking step.
 
 import numpy as np
 from typing import List, Dict, Tuple, Optional, Union
-from rank_bm25 import BM25Okapi
 from sentence_transformers import SentenceTransformer, CrossEncoder
-from sklearn.metrics.pairwise import cosine_similarity
-from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+import hashlib
 import math
+import os
 import torch
 
 from DocumentChunker import DocumentChunk
+from SparseBM25 import SparseBM25
+
+try:
+    import faiss  # Optional: ANN index for Stage 2 over the whole corpus
+except ImportError:
+    faiss = None
+
+
+# Prompt for LLM-based reranking (Stage 3, paper approach). The relevance score
+# is the model's probability of answering "có" rather than "không".
+_LLM_RERANK_PROMPT = """<|system|>Bạn là một chuyên gia đánh giá độ liên quan của tài liệu lịch sử Việt Nam. 
+Hãy cho biết đoạn văn có liên quan đến câu hỏi hay không, chỉ trả lời "có" hoặc "không".
+
+<|user|>
+Câu hỏi: {query}
+
+Đoạn văn: {doc}...
+
+Liên quan (có/không): <|assistant|>"""
+_LLM_YES_WORDS = ('có', 'Có')
+_LLM_NO_WORDS = ('không', 'Không')
+
+# Dense model / cross-encoder loaded once per process: instances with the same
+# model and inference settings (e.g. several configs in one demo) share them
+_MODEL_CACHE: Dict[tuple, object] = {}
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, in O(N + k log k)
+    
+    Same order as a stable descending sort: equal scores keep index order,
+    including which tied candidates make the cut at position k.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    
+    kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth_score)
+    ties = np.flatnonzero(scores == kth_score)[:k - len(above)]
+    selected = np.concatenate([above, ties])
+    return selected[np.argsort(-scores[selected], kind='stable')]
+
+
+def _length_order(texts: List[str]) -> np.ndarray:
+    """
+    Indices sorting texts by length (stable), for smart batching: similar-length
+    texts in one batch pad to nearly the same length. Character length is used as
+    a cheap proxy for token length.
+    """
+    return np.argsort(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), kind='stable')
 
 
 class ThreeStageRetrieval:
@@ -41,11 +94,22 @@ class ThreeStageRetrieval:
                  embedding_model: str = 'keepitreal/vietnamese-sbert',
                  use_dense_retrieval: bool = True,
                  stage2_top_k: int = 50,   # Reduced after BM25 filtering
+                 use_ann_index: bool = False,  # FAISS ANN index when Stage 2 sees every chunk
+                 ann_ef_search: int = 64,      # HNSW search breadth (recall vs latency)
+                 ann_index_type: str = 'hnsw',  # 'hnsw', 'sq8' (int8 codes), 'pq'
+                 embedding_cache_dir: Optional[str] = None,  # Memory-mapped embedding cache
                  
                  # Stage 3: Reranking settings
                  reranker_model: str = 'keepitreal/vietnamese-reranker',
                  use_reranking: bool = True,
                  stage3_top_k: int = 20,   # Final results
+                 rerank_batch_size: Optional[int] = None,  # Pairs per reranker forward pass
+                 
+                 # Inference settings
+                 precision: str = 'fp16',      # 'fp32', 'fp16' (GPU only), 'bf16'
+                 compile_models: bool = False,  # torch.compile encoder/cross-encoder
+                 model_backend: str = 'torch',  # 'torch', 'onnx', 'openvino'
+                 num_threads: Optional[int] = None,  # torch intra-op threads (CPU)
                  
                  # Fusion settings
                  bm25_weight: float = 0.3,
@@ -57,7 +121,24 @@ class ThreeStageRetrieval:
         Args:
             stage1_top_k: Number of candidates from BM25
             stage2_top_k: Number of candidates after dense retrieval
+            use_ann_index: Build a FAISS ANN index (see ann_index_type) used by Stage 2
+                when Stage 1 is disabled or keeps every chunk; needs faiss
+            ann_ef_search: HNSW efSearch per query (at least stage2_top_k)
+            ann_index_type: 'hnsw' graph over float vectors, or a compressed flat
+                scan: 'sq8' (int8 scalar quantizer, 4x smaller) / 'pq' (product
+                quantization, d/16 bytes per vector; falls back to 'sq8' under ~10k chunks)
+            embedding_cache_dir: Thư mục cache embeddings (.npy, memory-mapped khi load);
+                None = không cache
             stage3_top_k: Final number of results after reranking
+            rerank_batch_size: Number of query-chunk pairs per reranker forward pass;
+                None = 32 for the cross-encoder, 16 for the LLM reranker
+            precision: Model weights precision; 'fp16' only applies on GPU
+            compile_models: torch.compile the transformer of the dense model and
+                cross-encoder (slow first calls, recompiles on new input shapes)
+            model_backend: Inference backend of the dense model and cross-encoder;
+                'onnx'/'openvino' export the model on first load (needs
+                sentence-transformers>=3.2, and >=4.1 for the cross-encoder)
+            num_threads: Số thread intra-op của torch; None = min(8, số CPU)
         """
         
         # Stage configuration
@@ -68,6 +149,28 @@ class ThreeStageRetrieval:
         self.stage1_top_k = stage1_top_k
         self.stage2_top_k = stage2_top_k  
         self.stage3_top_k = stage3_top_k
+        self.use_ann_index = use_ann_index
+        self.ann_ef_search = ann_ef_search
+        self.ann_index_type = ann_index_type
+        self.faiss_index = None
+        self.embedding_model_name = embedding_model
+        self.embedding_cache_dir = Path(embedding_cache_dir) if embedding_cache_dir else None
+        self.rerank_batch_size = rerank_batch_size
+        
+        self.precision = precision
+        self.compile_models = compile_models
+        self.model_backend = model_backend
+        # Only passed when set, so older sentence-transformers keep working
+        backend_kwargs = {} if model_backend == 'torch' else {'backend': model_backend}
+        
+        # Tránh oversubscription trên máy nhiều core: SBERT encode nhanh nhất ở ~4-8 thread
+        if num_threads is None:
+            num_threads = min(8, os.cpu_count() or 1)
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Chỉ set được một lần, trước khi torch chạy song song
         
         # Weight configuration
         total_weight = bm25_weight + dense_weight + rerank_weight
@@ -85,8 +188,15 @@ class ThreeStageRetrieval:
         # Stage 2: Dense retrieval  
         if use_dense_retrieval:
             print(f"  📊 Loading dense retrieval model: {embedding_model}")
-            self.dense_model = SentenceTransformer(embedding_model)
+            self.dense_model = self._load_shared_model(
+                SentenceTransformer, embedding_model, backend_kwargs,
+                lambda model: self._optimize_for_inference(model, model._first_module(), 'auto_model')
+            )
             self.chunk_embeddings = None
+            # Repeated queries (document wrapper, comparisons) skip the encoder
+            self._encode_query = lru_cache(maxsize=1024)(self._encode_query_impl)
+            # FP16 embeddings on GPU when available, float32 NumPy on CPU
+            self.embedding_device = 'cuda' if torch.cuda.is_available() else 'cpu'
         else:
             self.dense_model = None
             
@@ -95,7 +205,10 @@ class ThreeStageRetrieval:
             print(f"  🎯 Loading reranker model: {reranker_model}")
             try:
                 # Try CrossEncoder first (traditional approach)
-                self.reranker = CrossEncoder(reranker_model)
+                self.reranker = self._load_shared_model(
+                    CrossEncoder, reranker_model, backend_kwargs,
+                    lambda model: self._optimize_for_inference(model.model, model, 'model')
+                )
                 self._reranker_type = 'cross_encoder'
             except:
                 try:
@@ -103,11 +216,31 @@ class ThreeStageRetrieval:
                     from transformers import AutoTokenizer, AutoModelForCausalLM
                     self.reranker_tokenizer = AutoTokenizer.from_pretrained(reranker_model)
                     self.reranker_model = AutoModelForCausalLM.from_pretrained(reranker_model)
+                    # Same precision rules as the cross-encoder: fp16 on GPU only, bf16 anywhere
+                    if torch.cuda.is_available():
+                        self.reranker_model.to('cuda')
+                        if precision == 'fp16':
+                            self.reranker_model.half()
+                    if precision == 'bf16':
+                        self.reranker_model.to(torch.bfloat16)
+                    # Right padding keeps positions intact. Documents are capped at 500
+                    # chars in the prompt, so only a very long query exceeds max_length;
+                    # left truncation then drops the start of the prompt (instruction,
+                    # question) but keeps the answer cue the score is read from
+                    self.reranker_tokenizer.padding_side = 'right'
+                    self.reranker_tokenizer.truncation_side = 'left'
+                    if self.reranker_tokenizer.pad_token is None:
+                        self.reranker_tokenizer.pad_token = self.reranker_tokenizer.eos_token
+                    self._yes_token_ids, self._no_token_ids = self._answer_token_ids()
+                    if not self._yes_token_ids or not self._no_token_ids:
+                        # Empty id list: logsumexp is -inf, scores become NaN or saturated
+                        raise ValueError("tokenizer has no distinct first token for có/không")
+                    self.reranker = self.reranker_model
                     self._reranker_type = 'llm_generator'
                     print(f"  ✓ Using LLM-based reranker (generative approach)")
-                except:
+                except Exception as e:
                     # Fallback to sentence transformer
-                    print(f"  ⚠️  LLM reranker failed, using SentenceTransformer for reranking")
+                    print(f"  ⚠️  LLM reranker failed ({e}), using SentenceTransformer for reranking")
                     self.reranker = SentenceTransformer(reranker_model)
                     self._reranker_type = 'sentence_transformer'
         else:
@@ -120,6 +253,32 @@ class ThreeStageRetrieval:
         
         print("✅ Three-Stage Retrieval System initialized!")
     
+    def _load_shared_model(self, model_cls, model_name: str, backend_kwargs: Dict, optimize):
+        """Load (and optimize) a model, or reuse the one loaded with the same settings"""
+        key = (model_cls.__name__, model_name, self.model_backend, self.precision, self.compile_models)
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            model = model_cls(model_name, **backend_kwargs)
+            optimize(model)
+            _MODEL_CACHE[key] = model
+        return model
+    
+    def _optimize_for_inference(self, model: torch.nn.Module, owner, attr: str):
+        """
+        Cast model to the configured precision and optionally torch.compile
+        its transformer (owner.<attr>); only for the PyTorch backend
+        """
+        if self.model_backend != 'torch':
+            return
+        
+        if self.precision == 'fp16' and torch.cuda.is_available():
+            model.half()
+        elif self.precision == 'bf16':
+            model.to(torch.bfloat16)
+        
+        if self.compile_models:
+            setattr(owner, attr, torch.compile(getattr(owner, attr), mode='reduce-overhead'))
+    
     def index_chunks(self,
                     chunks: List[DocumentChunk],
                     tokenized_chunks: List[List[str]],
@@ -135,19 +294,23 @@ class ThreeStageRetrieval:
         # Stage 1: Index BM25
         if self.use_bm25:
             print("  [Stage 1] Creating BM25 index...")
-            self.bm25 = BM25Okapi(tokenized_chunks)
+            self.bm25 = SparseBM25(tokenized_chunks)
             print(f"  ✓ BM25 indexed {len(tokenized_chunks)} chunks")
         
         # Stage 2: Index dense embeddings
         if self.use_dense_retrieval:
             print("  [Stage 2] Creating dense embeddings...")
             chunk_contents = [chunk.content for chunk in chunks]
-            self.chunk_embeddings = self.dense_model.encode(
-                chunk_contents,
-                show_progress_bar=True,
-                convert_to_numpy=True,
-                batch_size=32
-            )
+            embeddings = self._load_or_encode_chunks(chunk_contents)
+            
+            if self.embedding_device == 'cuda':
+                # Half precision on GPU: half the memory, dot products on the GPU
+                self.chunk_embeddings = torch.tensor(embeddings, dtype=torch.float16, device='cuda')
+            else:
+                self.chunk_embeddings = embeddings
+                
+                if self.use_ann_index:
+                    self._build_ann_index(embeddings)
             print(f"  ✓ Created dense embeddings for {len(chunk_contents)} chunks")
         
         # Stage 3: No pre-indexing needed for reranker
@@ -156,6 +319,42 @@ class ThreeStageRetrieval:
             
         print("✅ Three-stage indexing complete!")
     
+    def share_index_from(self, other: 'ThreeStageRetrieval') -> 'ThreeStageRetrieval':
+        """
+        Reuse the index of an already indexed instance instead of calling index_chunks
+        
+        Chunks, BM25 matrix, chunk embeddings and ANN index are shared by reference,
+        so configs that only differ in top-k / enabled stages cost no extra memory
+        or encoding time. Returns self.
+        """
+        if not other.chunks:
+            raise ValueError("Source retriever has no indexed chunks (call index_chunks first)")
+        
+        self.chunks = other.chunks
+        self.tokenized_chunks = other.tokenized_chunks
+        self.chunk_to_doc_map = other.chunk_to_doc_map
+        
+        if self.use_bm25:
+            # Only built here when the source config skipped Stage 1
+            self.bm25 = other.bm25 if other.bm25 is not None else SparseBM25(self.tokenized_chunks)
+        
+        if self.use_dense_retrieval:
+            if other.chunk_embeddings is None or other.embedding_model_name != self.embedding_model_name:
+                raise ValueError(
+                    "Source retriever has no chunk embeddings for "
+                    f"'{self.embedding_model_name}' to share"
+                )
+            self.chunk_embeddings = other.chunk_embeddings
+            
+            if self.use_ann_index and not isinstance(self.chunk_embeddings, torch.Tensor):
+                if other.faiss_index is not None:
+                    self.faiss_index = other.faiss_index
+                else:
+                    self._build_ann_index(self.chunk_embeddings)
+        
+        print(f"✓ Sharing three-stage index of {len(self.chunks)} chunks")
+        return self
+    
     def retrieve_three_stage(self,
                            query: str,
                            query_tokens: List[str],
@@ -174,29 +373,22 @@ class ThreeStageRetrieval:
             List[Tuple] or Dict with stage details
         """
         
+        if not return_stage_details:
+            return self._retrieve_fast(query, query_tokens, final_top_k)
+        
         stage_results = {}
-        candidate_pool = list(range(len(self.chunks)))  # Start with all chunks
+        candidate_pool = None  # None = all chunks (nothing allocated until a stage filters)
         
         # ==================== STAGE 1: BM25 Retrieval ====================
         if self.use_bm25 and self.bm25:
-            print(f"[Stage 1] BM25 retrieval from {len(candidate_pool)} chunks...")
-            
-            bm25_scores = self.bm25.get_scores(query_tokens)
-            
-            # Get top-k from BM25
-            bm25_results = [
-                (idx, score) for idx, score in enumerate(bm25_scores)
-                if idx in candidate_pool
-            ]
-            bm25_results.sort(key=lambda x: x[1], reverse=True)
-            bm25_top = bm25_results[:self.stage1_top_k]
+            print(f"[Stage 1] BM25 retrieval from {len(self.chunks)} chunks...")
             
-            # Update candidate pool
-            candidate_pool = [idx for idx, _ in bm25_top]
+            bm25_top, bm25_top_scores = self._stage1(query_tokens)
+            candidate_pool = bm25_top.tolist()
             
             stage_results['stage1_bm25'] = {
                 'candidates': len(candidate_pool),
-                'top_scores': [score for _, score in bm25_top[:5]],
+                'top_scores': bm25_top_scores[:5].tolist(),
                 'method': 'BM25 keyword matching'
             }
             
@@ -204,24 +396,10 @@ class ThreeStageRetrieval:
         
         # ==================== STAGE 2: Dense Retrieval ====================
         if self.use_dense_retrieval and self.chunk_embeddings is not None:
-            print(f"[Stage 2] Dense retrieval from {len(candidate_pool)} chunks...")
+            pool_size = len(self.chunks) if candidate_pool is None else len(candidate_pool)
+            print(f"[Stage 2] Dense retrieval from {pool_size} chunks...")
             
-            # Get query embedding
-            query_embedding = self.dense_model.encode([query], convert_to_numpy=True)
-            
-            # Calculate similarities only for candidate pool
-            candidate_embeddings = self.chunk_embeddings[candidate_pool]
-            similarities = cosine_similarity(query_embedding, candidate_embeddings)[0]
-            
-            # Get top-k from dense retrieval
-            dense_results = [
-                (candidate_pool[i], sim_score) 
-                for i, sim_score in enumerate(similarities)
-            ]
-            dense_results.sort(key=lambda x: x[1], reverse=True)
-            dense_top = dense_results[:self.stage2_top_k]
-            
-            # Update candidate pool
+            dense_top = self._stage2(query, candidate_pool)
             candidate_pool = [idx for idx, _ in dense_top]
             
             stage_results['stage2_dense'] = {
@@ -233,40 +411,14 @@ class ThreeStageRetrieval:
             print(f"  ✓ Stage 2 filtered to {len(candidate_pool)} candidates")
         
         # ==================== STAGE 3: Reranking ====================
-        final_results = []
+        if candidate_pool is None:
+            candidate_pool = range(len(self.chunks))
         
         if self.use_reranking and self.reranker and len(candidate_pool) > 0:
             print(f"[Stage 3] Reranking {len(candidate_pool)} chunks...")
             
-            # Prepare query-chunk pairs for reranking
-            rerank_pairs = []
-            for chunk_idx in candidate_pool:
-                chunk_content = self.chunks[chunk_idx].content
-                rerank_pairs.append([query, chunk_content])
-            
-            # Get reranking scores based on reranker type
-            if self._reranker_type == 'llm_generator':
-                # LLM-based generative reranking (paper approach)
-                rerank_scores = self._llm_generative_rerank(query, rerank_pairs)
-            elif self._reranker_type == 'cross_encoder':
-                # Traditional CrossEncoder
-                rerank_scores = self.reranker.predict(rerank_pairs)
-            else:
-                # Fallback: sentence similarity
-                rerank_scores = self._sentence_transformer_rerank(query, rerank_pairs)
-            
-            # Combine with candidate pool
-            rerank_results = [
-                (candidate_pool[i], score) 
-                for i, score in enumerate(rerank_scores)
-            ]
-            rerank_results.sort(key=lambda x: x[1], reverse=True)
-            rerank_top = rerank_results[:min(self.stage3_top_k, final_top_k)]
-            
-            # Final results with chunks
-            for chunk_idx, rerank_score in rerank_top:
-                chunk = self.chunks[chunk_idx]
-                final_results.append((chunk, rerank_score))
+            rerank_top = self._stage3(query, candidate_pool, final_top_k)
+            final_results = self._to_chunk_results(rerank_top, candidate_pool, final_top_k)
             
             stage_results['stage3_rerank'] = {
                 'candidates': len(final_results),
@@ -275,92 +427,327 @@ class ThreeStageRetrieval:
             }
             
             print(f"  ✓ Stage 3 final {len(final_results)} results")
-            
         else:
-            # No reranking - use stage 2 results
-            for chunk_idx in candidate_pool[:final_top_k]:
-                chunk = self.chunks[chunk_idx]
-                # Use last available score (dense or BM25)
-                score = 1.0  # Placeholder
-                final_results.append((chunk, score))
-        
-        # Return results
-        if return_stage_details:
-            return {
-                'final_results': final_results,
-                'stage_details': stage_results,
-                'pipeline_summary': {
-                    'initial_candidates': len(self.chunks),
-                    'after_stage1': stage_results.get('stage1_bm25', {}).get('candidates', len(self.chunks)),
-                    'after_stage2': stage_results.get('stage2_dense', {}).get('candidates', len(candidate_pool)),
-                    'final_results': len(final_results)
-                }
+            final_results = self._to_chunk_results(None, candidate_pool, final_top_k)
+        
+        return {
+            'final_results': final_results,
+            'stage_details': stage_results,
+            'pipeline_summary': {
+                'initial_candidates': len(self.chunks),
+                'after_stage1': stage_results.get('stage1_bm25', {}).get('candidates', len(self.chunks)),
+                'after_stage2': stage_results.get('stage2_dense', {}).get('candidates', len(candidate_pool)),
+                'final_results': len(final_results)
             }
+        }
+    
+    def _retrieve_fast(self, query: str, query_tokens: List[str], final_top_k: int) -> List[Tuple]:
+        """Three-stage pipeline without stage details or progress output"""
+        candidate_pool = None
+        
+        if self.use_bm25 and self.bm25:
+            candidate_pool = self._stage1(query_tokens)[0].tolist()
+        
+        if self.use_dense_retrieval and self.chunk_embeddings is not None:
+            candidate_pool = [idx for idx, _ in self._stage2(query, candidate_pool)]
+        
+        if candidate_pool is None:
+            candidate_pool = range(len(self.chunks))
+        
+        rerank_top = None
+        if self.use_reranking and self.reranker and len(candidate_pool) > 0:
+            rerank_top = self._stage3(query, candidate_pool, final_top_k)
+        
+        return self._to_chunk_results(rerank_top, candidate_pool, final_top_k)
+    
+    def _stage1(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Stage 1: indices and scores of the BM25 top-k chunks, best first"""
+        bm25_scores = self.bm25.get_scores(query_tokens)
+        bm25_top = _top_k_indices(bm25_scores, self.stage1_top_k)
+        return bm25_top, bm25_scores[bm25_top]
+    
+    def _stage2(self, query: str, candidate_pool: Optional[List[int]]) -> List[Tuple[int, float]]:
+        """Stage 2: (chunk index, cosine) of the dense top-k within the candidate pool"""
+        return self._dense_top_k(query, candidate_pool)
+    
+    def _stage3(self, query: str, candidate_pool, final_top_k: int) -> List[Tuple[int, float]]:
+        """Stage 3: (chunk index, rerank score) of the best candidates, best first"""
+        rerank_pairs = [[query, self.chunks[chunk_idx].content] for chunk_idx in candidate_pool]
+        
+        # Get reranking scores based on reranker type
+        if self._reranker_type == 'llm_generator':
+            # LLM-based generative reranking (paper approach)
+            rerank_scores = self._llm_generative_rerank(query, rerank_pairs)
+        elif self._reranker_type == 'cross_encoder':
+            # Traditional CrossEncoder
+            rerank_scores = self._cross_encoder_rerank(rerank_pairs)
         else:
-            return final_results
+            # Fallback: sentence similarity
+            rerank_scores = self._sentence_transformer_rerank(query, rerank_pairs)
+        
+        rerank_scores = np.asarray(rerank_scores).reshape(-1)
+        top = _top_k_indices(rerank_scores, min(self.stage3_top_k, final_top_k))
+        return [
+            (candidate_pool[i], score)
+            for i, score in zip(top.tolist(), rerank_scores[top].tolist())
+        ]
     
-    def _llm_generative_rerank(self, query: str, rerank_pairs: List[List[str]]) -> List[float]:
+    def _to_chunk_results(self,
+                          rerank_top: Optional[List[Tuple[int, float]]],
+                          candidate_pool,
+                          final_top_k: int) -> List[Tuple]:
+        """(chunk, score) results; without reranking, the pool order with a placeholder score"""
+        if rerank_top is not None:
+            return [(self.chunks[chunk_idx], score) for chunk_idx, score in rerank_top]
+        # No reranking - use stage 2 results
+        return [(self.chunks[chunk_idx], 1.0) for chunk_idx in candidate_pool[:final_top_k]]
+    
+    def _encode_chunks(self, chunk_contents: List[str]) -> np.ndarray:
+        """Encode chunk contents into unit-length float32 rows (cosine = dot product)"""
+        if torch.cuda.device_count() > 1 and not self.compile_models:
+            # Shard encoding across all GPUs (one worker process per device)
+            pool = self.dense_model.start_multi_process_pool()
+            try:
+                embeddings = self.dense_model.encode_multi_process(
+                    chunk_contents, pool, batch_size=64
+                )
+            finally:
+                self.dense_model.stop_multi_process_pool(pool)
+            embeddings = embeddings / np.maximum(
+                np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+            )
+        else:
+            embeddings = self.dense_model.encode(
+                chunk_contents,
+                show_progress_bar=True,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                batch_size=64
+            )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    def _embedding_cache_file(self, chunk_contents: List[str]) -> Optional[Path]:
+        """Cache file keyed by embedding model and chunk contents"""
+        if self.embedding_cache_dir is None:
+            return None
+        
+        content_hash = hashlib.md5()
+        content_hash.update(self.embedding_model_name.encode('utf-8'))
+        for content in chunk_contents:
+            content_hash.update(b'\0')
+            content_hash.update(content.encode('utf-8'))
+        
+        self.embedding_cache_dir.mkdir(parents=True, exist_ok=True)
+        return self.embedding_cache_dir / f"embeddings_{content_hash.hexdigest()[:16]}.npy"
+    
+    def _load_or_encode_chunks(self, chunk_contents: List[str]) -> np.ndarray:
+        """
+        Chunk embeddings from the .npy cache (memory-mapped, read-only) or freshly
+        encoded; new encodings are written to the cache and reopened memory-mapped
+        """
+        cache_file = self._embedding_cache_file(chunk_contents)
+        
+        if cache_file is not None and cache_file.exists():
+            try:
+                # Pages are read on demand and shared by processes using the same file
+                embeddings = np.load(cache_file, mmap_mode='r')
+                if embeddings.shape[0] == len(chunk_contents):
+                    print(f"  ✓ Loaded cached embeddings from {cache_file}")
+                    return embeddings
+            except Exception as e:
+                print(f"⚠️ Error loading embedding cache: {e}")
+        
+        embeddings = self._encode_chunks(chunk_contents)
+        
+        if cache_file is not None:
+            # Temp file + rename: an interrupted run never leaves a truncated .npy
+            tmp_path = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, embeddings)
+            os.replace(tmp_path, cache_file)
+            print(f"💾 Cached embeddings to {cache_file}")
+            embeddings = np.load(cache_file, mmap_mode='r')
+        
+        return embeddings
+    
+    def _build_ann_index(self, embeddings: np.ndarray):
+        """ANN index over the normalized chunk embeddings (inner product = cosine)"""
+        if faiss is None:
+            print("  ⚠️  faiss not installed, Stage 2 keeps exact search")
+            return
+        
+        n, dim = embeddings.shape
+        index_type = self.ann_index_type
+        # k-means cần ~39 điểm mỗi centroid (256 centroids mỗi sub-quantizer)
+        if index_type == 'pq' and (dim % 16 != 0 or n < 39 * 256):
+            print("  ⚠️  Too few chunks / dims for PQ training, using 'sq8' instead")
+            index_type = 'sq8'
+        
+        if index_type == 'hnsw':
+            self.faiss_index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            self.faiss_index.hnsw.efConstruction = 200
+        elif index_type == 'sq8':
+            self.faiss_index = faiss.IndexScalarQuantizer(
+                dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+        elif index_type == 'pq':
+            # 16 dims per 8-bit sub-quantizer (M=48 for 768-d embeddings)
+            self.faiss_index = faiss.IndexPQ(dim, dim // 16, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            raise ValueError(f"Unknown ann_index_type: {index_type}")
+        
+        if not self.faiss_index.is_trained:
+            self.faiss_index.train(embeddings)
+        self.faiss_index.add(embeddings)
+        print(f"  ✓ Built {index_type.upper()} index for {self.faiss_index.ntotal} chunks")
+    
+    def _encode_query_impl(self, query: str) -> np.ndarray:
+        """Normalized float32 query embedding (cached by _encode_query, read-only)"""
+        query_embedding = self.dense_model.encode(
+            query, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32)
+        query_embedding.flags.writeable = False
+        return query_embedding
+    
+    def _dense_top_k(self, query: str, candidate_pool: Optional[List[int]]) -> List[Tuple[int, float]]:
         """
-        LLM-based generative reranking (paper approach)
+        Stage 2: (chunk_idx, cosine) of the best stage2_top_k candidates, best first
         
-        Uses LLM to generate relevance scores for query-document pairs
-        This is the true "Stage 3" from the paper - using LLM to generate final shortlist
+        candidate_pool=None means every chunk: the embedding matrix is scored as is,
+        without gathering rows.
         """
-        import torch
+        if isinstance(self.chunk_embeddings, torch.Tensor):
+            # GPU path: score and select on the device, copy back only the top-k
+            device = self.chunk_embeddings.device
+            query_embedding = torch.tensor(self._encode_query(query), device=device, dtype=torch.float16)
+            
+            if candidate_pool is None:
+                candidate_pool = range(len(self.chunks))
+                candidate_embeddings = self.chunk_embeddings
+            else:
+                pool = torch.as_tensor(candidate_pool, dtype=torch.long, device=device)
+                candidate_embeddings = self.chunk_embeddings[pool]
+            similarities = candidate_embeddings @ query_embedding
+            
+            top = torch.topk(similarities, min(self.stage2_top_k, similarities.numel()))
+            return [
+                (candidate_pool[i], score)
+                for i, score in zip(top.indices.tolist(), top.values.float().tolist())
+            ]
         
-        scores = []
+        # Get query embedding (normalized like the chunk embeddings)
+        query_embedding = self._encode_query(query)
         
-        for query_text, doc_text in rerank_pairs:
-            # Create prompt for LLM to assess relevance
-            prompt = f"""<|system|>Bạn là một chuyên gia đánh giá độ liên quan của tài liệu lịch sử Việt Nam. 
-Hãy đánh giá độ liên quan giữa câu hỏi và đoạn văn từ 0.0 đến 1.0.
-
-<|user|>
-Câu hỏi: {query_text}
-
-Đoạn văn: {doc_text[:500]}...
-
-Độ liên quan (0.0-1.0): <|assistant|>"""
-
+        if self.faiss_index is not None and (candidate_pool is None or len(candidate_pool) == len(self.chunks)):
+            # Pool is the whole corpus: approximate top-k from the HNSW graph
+            k = min(self.stage2_top_k, len(self.chunks))
+            if isinstance(self.faiss_index, faiss.IndexHNSW):
+                # efSearch per call: an index shared via share_index_from keeps no per-config state
+                params = faiss.SearchParametersHNSW(efSearch=max(self.ann_ef_search, k))
+                scores, ids = self.faiss_index.search(query_embedding[None, :], k, params=params)
+            else:
+                scores, ids = self.faiss_index.search(query_embedding[None, :], k)
+            return [(idx, score) for idx, score in zip(ids[0].tolist(), scores[0].tolist()) if idx >= 0]
+        
+        # Calculate cosine similarities only for candidate pool
+        if candidate_pool is None:
+            candidate_pool = range(len(self.chunks))
+            candidate_embeddings = self.chunk_embeddings
+        else:
+            candidate_embeddings = self.chunk_embeddings[candidate_pool]
+        similarities = candidate_embeddings @ query_embedding
+        
+        # Get top-k from dense retrieval
+        top = _top_k_indices(similarities, self.stage2_top_k)
+        return [
+            (candidate_pool[i], score)
+            for i, score in zip(top.tolist(), similarities[top].tolist())
+        ]
+    
+    def _answer_token_ids(self) -> Tuple[List[int], List[int]]:
+        """First token ids of the yes/no answers (with and without a leading space)"""
+        def first_ids(words):
+            ids = set()
+            for word in words:
+                for variant in (word, ' ' + word):
+                    token_ids = self.reranker_tokenizer.encode(variant, add_special_tokens=False)
+                    if token_ids:
+                        ids.add(token_ids[0])
+            return ids
+        
+        yes_ids, no_ids = first_ids(_LLM_YES_WORDS), first_ids(_LLM_NO_WORDS)
+        shared = yes_ids & no_ids
+        return sorted(yes_ids - shared), sorted(no_ids - shared)
+    
+    def _llm_generative_rerank(self, query: str, rerank_pairs: List[List[str]]) -> List[float]:
+        """
+        LLM-based reranking (paper approach)
+        
+        One forward pass per batch: the relevance score is P("có") / (P("có") + P("không"))
+        for the answer token following the prompt, instead of generating and parsing text.
+        """
+        prompts = [
+            _LLM_RERANK_PROMPT.format(query=query_text, doc=doc_text[:500])
+            for query_text, doc_text in rerank_pairs
+        ]
+        
+        # Smart batching: prompts of similar length share a batch (less padding)
+        order = _length_order(prompts)
+        scores = np.empty(len(prompts))
+        batch_size = max(1, self.rerank_batch_size or 16)
+        
+        for start in range(0, len(prompts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            batch_prompts = [prompts[i] for i in batch_idx]
+            
             try:
-                # Tokenize and generate
-                inputs = self.reranker_tokenizer(prompt, return_tensors="pt", max_length=1024, truncation=True)
+                # Tokenize the whole batch at once
+                inputs = self.reranker_tokenizer(
+                    batch_prompts,
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=1024
+                ).to(self.reranker_model.device)
                 
-                with torch.no_grad():
-                    outputs = self.reranker_model.generate(
-                        **inputs,
-                        max_new_tokens=10,
-                        temperature=0.1,
-                        do_sample=False,
-                        pad_token_id=self.reranker_tokenizer.eos_token_id
-                    )
+                with torch.inference_mode():
+                    logits = self.reranker_model(**inputs).logits
                 
-                # Decode response
-                response = self.reranker_tokenizer.decode(outputs[0][inputs['input_ids'].shape[1]:], skip_special_tokens=True)
+                # Next-token logits after the last real (non-padding) token of each prompt
+                last = inputs['attention_mask'].sum(dim=1) - 1
+                next_logits = logits[torch.arange(len(last), device=last.device), last].float()
+                log_probs = torch.log_softmax(next_logits, dim=-1)
                 
-                # Extract score from response
-                try:
-                    score = float(response.strip())
-                    score = max(0.0, min(1.0, score))  # Clamp to [0,1]
-                except:
-                    score = 0.5  # Default score if parsing fails
-                    
-                scores.append(score)
+                yes = torch.logsumexp(log_probs[:, self._yes_token_ids], dim=-1)
+                no = torch.logsumexp(log_probs[:, self._no_token_ids], dim=-1)
+                scores[batch_idx] = torch.sigmoid(yes - no).cpu().numpy()
                 
             except Exception as e:
-                print(f"LLM reranking failed for pair: {e}")
-                scores.append(0.5)  # Default score
+                print(f"LLM reranking failed for batch: {e}")
+                scores[batch_idx] = 0.5  # Default scores
         
+        return scores.tolist()
+    
+    def _cross_encoder_rerank(self, rerank_pairs: List[List[str]]) -> np.ndarray:
+        """CrossEncoder scores, predicted in length-sorted order and restored to input order"""
+        order = _length_order([doc_text for _, doc_text in rerank_pairs])
+        sorted_scores = self.reranker.predict(
+            [rerank_pairs[i] for i in order],
+            batch_size=max(1, self.rerank_batch_size or 32)
+        )
+        
+        scores = np.empty(len(rerank_pairs))
+        scores[order] = np.asarray(sorted_scores).reshape(-1)
         return scores
     
     def _sentence_transformer_rerank(self, query: str, rerank_pairs: List[List[str]]) -> List[float]:
         """Fallback reranking using sentence transformer"""
-        query_embedding = self.reranker.encode([query], convert_to_numpy=True)
+        query_embedding = self.reranker.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0]
         
         chunk_contents = [pair[1] for pair in rerank_pairs]
-        chunk_embeddings = self.reranker.encode(chunk_contents, convert_to_numpy=True)
+        chunk_embeddings = self.reranker.encode(chunk_contents, convert_to_numpy=True, normalize_embeddings=True)
         
-        similarities = cosine_similarity(query_embedding, chunk_embeddings)[0]
+        similarities = chunk_embeddings @ query_embedding
         return similarities.tolist()
     
     def retrieve_documents_three_stage(self,
@@ -376,25 +763,37 @@ Câu hỏi: {query_text}
             final_top_k=50  # Get more chunks for document aggregation
         )
         
-        # Group by document
-        doc_chunks = defaultdict(list)
-        for chunk, score in chunk_results:
-            doc_id = self.chunk_to_doc_map.get(chunk.chunk_id)
-            if doc_id is not None:
-                doc_chunks[doc_id].append((chunk, score))
-        
-        # Aggregate document scores (using max strategy)
+        # Chunks that belong to a known document
+        chunk_results = [
+            (chunk, score, self.chunk_to_doc_map.get(chunk.chunk_id))
+            for chunk, score in chunk_results
+        ]
+        chunk_results = [result for result in chunk_results if result[2] is not None]
+        if not chunk_results:
+            return []
+        
+        scores = np.array([score for _, score, _ in chunk_results], dtype=np.float64)
+        doc_ids = np.array([doc_id for _, _, doc_id in chunk_results])
+        
+        # Group by document: max score per document (sort + reduceat)
+        unique_docs, first_seen, group_of = np.unique(doc_ids, return_index=True, return_inverse=True)
+        by_group = np.argsort(group_of, kind='stable')
+        group_starts = np.searchsorted(group_of[by_group], np.arange(len(unique_docs)))
+        group_ends = np.append(group_starts[1:], len(scores))
+        doc_scores = np.maximum.reduceat(scores[by_group], group_starts)
+        
+        # Sort documents by score; ties keep the order documents first appeared in
+        doc_order = np.lexsort((first_seen, -doc_scores))[:top_k_documents]
+        
+        # Best 3 chunks of the selected documents only
         doc_results = []
-        for doc_id, chunk_score_pairs in doc_chunks.items():
-            doc_score = max(score for _, score in chunk_score_pairs)
-            best_chunks = sorted(chunk_score_pairs, key=lambda x: x[1], reverse=True)[:3]
-            best_chunks = [chunk for chunk, _ in best_chunks]
-            
-            doc_results.append((doc_id, doc_score, best_chunks))
+        for group in doc_order.tolist():
+            positions = by_group[group_starts[group]:group_ends[group]]
+            best = positions[np.argsort(-scores[positions], kind='stable')[:3]]
+            best_chunks = [chunk_results[i][0] for i in best.tolist()]
+            doc_results.append((unique_docs[group].item(), float(doc_scores[group]), best_chunks))
         
-        # Sort and return top documents
-        doc_results.sort(key=lambda x: x[1], reverse=True)
-        return doc_results[:top_k_documents]
+        return doc_results
     
     def compare_with_current_system(self,
                                   query: str, 
@@ -465,6 +864,7 @@ def create_three_stage_config(use_case: str = 'balanced') -> Dict:
             'use_reranking': False,        # Skip expensive reranking
             'stage1_top_k': 100,
             'stage2_top_k': 20,
+            'ann_ef_search': 64,           # Only used with use_ann_index and no Stage 1
             'bm25_weight': 0.4,
             'dense_weight': 0.6
         }
@@ -477,6 +877,8 @@ def create_three_stage_config(use_case: str = 'balanced') -> Dict:
             'stage1_top_k': 100,
             'stage2_top_k': 50,
             'stage3_top_k': 20,
+            'ann_ef_search': 256,
+            'rerank_batch_size': 32,       # Rerank all Stage 2 candidates in 2 batches
             'bm25_weight': 0.3,
             'dense_weight': 0.4,
             'rerank_weight': 0.3
@@ -3,13 +3,22 @@ Tokenizer.py
 Chịu trách nhiệm: Token hóa văn bản tiếng Việt
 """
 
+import os
 import re
 import unicodedata
-from typing import List, Set
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from underthesea import word_tokenize
 from pyvi import ViTokenizer
 
 
+# Regex chuẩn hóa, compile một lần khi import module
+_VI_CHARS = 'àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ'
+_SPECIAL_CHARS = re.compile(rf'[^\w\s{_VI_CHARS}]')
+_WS = re.compile(r'\s+')
+
+
 class VietnameseTokenizer:
     """
     Lớp xử lý tokenization cho tiếng Việt.
@@ -32,14 +41,29 @@ class VietnameseTokenizer:
         """
         self.use_stopwords = use_stopwords
         self.library = library
-        self.stopwords = self._load_stopwords() if use_stopwords else set()
+        self.stopwords = self._load_stopwords() if use_stopwords else frozenset()
+        self._init_caches()
+    
+    def _init_caches(self):
+        """LRU cache theo text: query lặp lại không phải segment lại"""
+        self._cached_tok = lru_cache(maxsize=4096)(self._tokenize_impl)
+    
+    def __getstate__(self):
+        # lru_cache wrapper of a bound method is not picklable (process pool)
+        state = self.__dict__.copy()
+        state.pop('_cached_tok', None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_caches()
         
-    def _load_stopwords(self) -> Set[str]:
+    def _load_stopwords(self) -> frozenset:
         """
         Load danh sách stopwords tiếng Việt
         
         Returns:
-            Set[str]: Tập hợp stopwords
+            frozenset: Tập hợp stopwords
         """
         # Danh sách stopwords tiếng Việt cơ bản
         stopwords = {
@@ -49,7 +73,7 @@ class VietnameseTokenizer:
             'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at',
             'to', 'for', 'of', 'with', 'by', 'from', 'as', 'is', 'was'
         }
-        return stopwords
+        return frozenset(stopwords)
     
     def normalize_text(self, text: str) -> str:
         """
@@ -61,17 +85,18 @@ class VietnameseTokenizer:
         Returns:
             str: Văn bản đã chuẩn hóa
         """
-        # Unicode normalization
-        text = unicodedata.normalize('NFC', text)
+        # Unicode normalization (ASCII text is already NFC)
+        if not text.isascii():
+            text = unicodedata.normalize('NFC', text)
         
         # Chuyển về lowercase
         text = text.lower()
         
         # Loại bỏ các ký tự đặc biệt, giữ lại chữ cái tiếng Việt và số
-        text = re.sub(r'[^\w\sàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]', ' ', text)
+        text = _SPECIAL_CHARS.sub(' ', text)
         
         # Loại bỏ khoảng trắng thừa
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WS.sub(' ', text).strip()
         
         return text
     
@@ -86,6 +111,13 @@ class VietnameseTokenizer:
         Returns:
             List[str]: Danh sách các tokens
         """
+        if remove_stopwords is None:
+            remove_stopwords = self.use_stopwords
+        
+        return list(self._cached_tok(text, remove_stopwords))
+    
+    def _tokenize_impl(self, text: str, remove_stopwords: bool) -> Tuple[str, ...]:
+        """Tokenize body behind the LRU cache (tuple so cached output is immutable)"""
         # Chuẩn hóa văn bản
         text = self.normalize_text(text)
         
@@ -99,25 +131,30 @@ class VietnameseTokenizer:
             tokens = text.split()
         
         # Loại bỏ stopwords nếu cần
-        if remove_stopwords is None:
-            remove_stopwords = self.use_stopwords
-            
-        if remove_stopwords:
-            tokens = [token for token in tokens if token not in self.stopwords]
-        
-        # Loại bỏ tokens quá ngắn (< 2 ký tự)
-        tokens = [token for token in tokens if len(token) >= 2]
+        stopwords = self.stopwords if remove_stopwords else frozenset()
         
-        return tokens
+        # Loại bỏ stopwords và tokens quá ngắn (< 2 ký tự) trong một lần duyệt
+        return tuple(token for token in tokens if len(token) >= 2 and token not in stopwords)
     
-    def tokenize_documents(self, documents: List[str]) -> List[List[str]]:
+    def tokenize_documents(self, documents: List[str], n_workers: Optional[int] = 1) -> List[List[str]]:
         """
         Token hóa nhiều documents
         
         Args:
             documents: Danh sách các documents
+            n_workers: Số process song song (1 = tuần tự, None = os.cpu_count()).
+                Mỗi process tự load underthesea/pyvi một lần.
             
         Returns:
             List[List[str]]: Danh sách các document đã tokenize
         """
-        return [self.tokenize(doc) for doc in documents]
+        n_workers = n_workers or os.cpu_count() or 1
+        # Ít documents: chi phí khởi động process lớn hơn phần tiết kiệm được
+        if n_workers <= 1 or len(documents) < max(32, 2 * n_workers):
+            return [self.tokenize(doc) for doc in documents]
+        
+        # Word segmentation is pure-Python CPU work: spread it over processes,
+        # ~4 tasks per worker to balance uneven document lengths
+        chunksize = max(1, len(documents) // (4 * n_workers))
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return list(executor.map(self.tokenize, documents, chunksize=chunksize))
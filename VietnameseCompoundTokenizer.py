@@ -5,9 +5,117 @@
 Enhanced Vietnamese Tokenizer với hỗ trợ compound words và n-grams
 """
 
+import io
 import re
-from typing import List, Dict, Set, Tuple
+import sys
+from typing import List, Dict, Tuple
 from collections import defaultdict
+from functools import lru_cache
+
+try:
+    import ahocorasick  # Optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+_PUNCT_RE = re.compile(r'[^\w\s]+')  # Mỗi cụm dấu câu thay bằng một khoảng trắng
+
+# Từ điển dùng chung cho mọi instance: build và intern một lần khi import module
+_COMPOUND_WORDS = frozenset(map(sys.intern, {
+    # Địa danh
+    'việt nam', 'đông nam á', 'bắc việt', 'nam việt',
+    'trung quốc', 'hoa kỳ', 'liên xô', 'nhật bản',
+    'điện biên phủ', 'cao bằng', 'lạng sơn', 'quảng ninh',
+    'hà nội', 'tp hồ chí minh', 'sài gòn', 'đà nẵng',
+
+    # Tên người (patterns)
+    'hồ chí minh', 'nguyễn ái quốc', 'bác hồ',
+    'bà triệu', 'triệu thị trinh', 'hai bà trưng',
+    'trần hưng đạo', 'lê lợi', 'nguyễn huệ',
+    'võ nguyên giáp', 'phạm văn đồng',
+
+    # Sự kiện lịch sử
+    'chiến tranh việt nam', 'kháng chiến chống pháp',
+    'kháng chiến chống mỹ', 'giải phóng miền nam',
+    'thống nhất đất nước', 'cách mạng tháng tám',
+    'khởi nghĩa', 'cách mạng', 'giải phóng',
+
+    # Tổ chức
+    'mặt trận giải phóng', 'việt minh', 'đảng cộng sản',
+    'chính phủ', 'quốc hội', 'ủy ban', 'ban chấp hành',
+
+    # Khái niệm
+    'độc lập', 'tự do', 'hòa bình', 'thống nhất',
+    'dân tộc', 'tổ quốc', 'quê hương', 'đất nước',
+    'lãnh tụ', 'anh hùng', 'liệt sĩ', 'nhân dân',
+
+    # Thời gian
+    'thế kỷ', 'thiên niên kỷ', 'triều đại', 'thời kỳ',
+    'năm nay', 'năm trước', 'ngày nay', 'thời cổ'
+}))
+
+_NAMED_ENTITIES = {
+    sys.intern(canonical): tuple(map(sys.intern, variants))
+    for canonical, variants in {
+        'hồ chí minh': ('hồ chí minh', 'nguyễn ái quốc', 'bác hồ', 'chủ tịch hồ chí minh'),
+        'bà triệu': ('bà triệu', 'triệu thị trinh', 'triệu trinh nương', 'triệu quốc trinh'),
+        'việt nam': ('việt nam', 'nước việt', 'đại việt', 'annam', 'cochinchina'),
+        'điện biên phủ': ('điện biên phủ', 'điện biên', 'dien bien phu'),
+        'hai bà trưng': ('hai bà trưng', 'trưng trắc', 'trưng nhị', 'bà trưng'),
+        'chiến tranh việt nam': ('chiến tranh việt nam', 'vietnam war', 'kháng chiến chống mỹ')
+    }.items()
+}
+
+# (variant, canonical) theo thứ tự khai báo, cho một vòng lặp phẳng
+_ENTITY_VARIANTS = tuple(
+    (variant, canonical)
+    for canonical, variants in _NAMED_ENTITIES.items()
+    for variant in variants
+)
+
+_STOPWORDS = frozenset(map(sys.intern, {
+    'là', 'của', 'và', 'có', 'được', 'trong', 'với', 'từ', 'về', 'cho',
+    'một', 'hai', 'ba', 'này', 'đó', 'những', 'các', 'tất cả', 'mọi',
+    'để', 'sẽ', 'đã', 'đang', 'rất', 'rất nhiều', 'nhiều', 'ít'
+}))
+
+
+class _RegexPhraseMatcher:
+    """
+    Fallback khi thiếu pyahocorasick: một regex alternation của tất cả patterns,
+    cùng API iter(text) -> (end_index, value) như ahocorasick.Automaton
+    
+    Lookahead (?=(...)) thử match ở mọi vị trí; patterns xếp dài trước nên mỗi
+    vị trí cho pattern dài nhất, các pattern ngắn hơn cùng vị trí chính là các
+    prefix của nó (tính sẵn) -> đủ mọi match chồng nhau như substring scan
+    """
+    
+    def __init__(self, items):
+        self._values = dict(items)
+        by_len = sorted(self._values, key=len, reverse=True)
+        self._regex = re.compile('(?=(' + '|'.join(map(re.escape, by_len)) + '))')
+        self._prefixes = {
+            pattern: [other for other in by_len if pattern.startswith(other)]
+            for pattern in by_len
+        }
+    
+    def iter(self, text: str):
+        for match in self._regex.finditer(text):
+            start = match.start()
+            for pattern in self._prefixes[match.group(1)]:
+                yield start + len(pattern) - 1, self._values[pattern]
+
+
+def _build_automaton(items):
+    """Aho-Corasick automaton từ các cặp (pattern, value); regex fallback nếu thiếu pyahocorasick"""
+    if ahocorasick is None:
+        return _RegexPhraseMatcher(items)
+    
+    automaton = ahocorasick.Automaton()
+    for pattern, value in items:
+        automaton.add_word(pattern, value)
+    automaton.make_automaton()
+    return automaton
+
 
 class VietnameseCompoundTokenizer:
     """
@@ -19,117 +127,131 @@ class VietnameseCompoundTokenizer:
     """
     
     def __init__(self):
-        self.compound_words = self._load_compound_words()
-        self.named_entities = self._load_named_entities()
-        self.stopwords = self._load_vietnamese_stopwords()
-        
-    def _load_compound_words(self) -> Set[str]:
-        """Load danh sách từ ghép tiếng Việt quan trọng"""
-        compound_words = {
-            # Địa danh
-            'việt nam', 'đông nam á', 'bắc việt', 'nam việt', 
-            'trung quốc', 'hoa kỳ', 'liên xô', 'nhật bản',
-            'điện biên phủ', 'cao bằng', 'lạng sơn', 'quảng ninh',
-            'hà nội', 'tp hồ chí minh', 'sài gòn', 'đà nẵng',
-            
-            # Tên người (patterns)
-            'hồ chí minh', 'nguyễn ái quốc', 'bác hồ', 
-            'bà triệu', 'triệu thị trinh', 'hai bà trưng',
-            'trần hưng đạo', 'lê lợi', 'nguyễn huệ',
-            'võ nguyên giáp', 'phạm văn đồng',
-            
-            # Sự kiện lịch sử
-            'chiến tranh việt nam', 'kháng chiến chống pháp',
-            'kháng chiến chống mỹ', 'giải phóng miền nam',
-            'thống nhất đất nước', 'cách mạng tháng tám',
-            'khởi nghĩa', 'cách mạng', 'giải phóng',
-            
-            # Tổ chức
-            'mặt trận giải phóng', 'việt minh', 'đảng cộng sản',
-            'chính phủ', 'quốc hội', 'ủy ban', 'ban chấp hành',
-            
-            # Khái niệm
-            'độc lập', 'tự do', 'hòa bình', 'thống nhất',
-            'dân tộc', 'tổ quốc', 'quê hương', 'đất nước',
-            'lãnh tụ', 'anh hùng', 'liệt sĩ', 'nhân dân',
-            
-            # Thời gian
-            'thế kỷ', 'thiên niên kỷ', 'triều đại', 'thời kỳ',
-            'năm nay', 'năm trước', 'ngày nay', 'thời cổ'
-        }
-        return compound_words
-    
-    def _load_named_entities(self) -> Dict[str, List[str]]:
-        """Load named entities với các variants"""
-        entities = {
-            'hồ chí minh': ['hồ chí minh', 'nguyễn ái quốc', 'bác hồ', 'chủ tịch hồ chí minh'],
-            'bà triệu': ['bà triệu', 'triệu thị trinh', 'triệu trinh nương', 'triệu quốc trinh'],
-            'việt nam': ['việt nam', 'nước việt', 'đại việt', 'annam', 'cochinchina'],
-            'điện biên phủ': ['điện biên phủ', 'điện biên', 'dien bien phu'],
-            'hai bà trưng': ['hai bà trưng', 'trưng trắc', 'trưng nhị', 'bà trưng'],
-            'chiến tranh việt nam': ['chiến tranh việt nam', 'vietnam war', 'kháng chiến chống mỹ']
+        self.compound_words = _COMPOUND_WORDS
+        self.named_entities = _NAMED_ENTITIES
+        self.stopwords = _STOPWORDS
+        self._entity_variants = _ENTITY_VARIANTS
+        
+        # Compound words xếp sẵn theo độ dài (longest first) để avoid conflicts
+        self._compounds_by_len = sorted(self.compound_words, key=len, reverse=True)
+        
+        # Một lần duyệt text cho tất cả patterns (kể cả các match chồng nhau);
+        # value là vị trí của compound trong _compounds_by_len
+        self._compound_ac = _build_automaton(
+            (c, rank) for rank, c in enumerate(self._compounds_by_len)
+        )
+        self._entity_ac = _build_automaton(
+            (variant, (order, variant, canonical))
+            for order, (variant, canonical) in enumerate(self._entity_variants)
+        )
+        phrase_entries = self._phrase_entries()
+        self._phrase_trie = self._build_phrase_trie(phrase_entries)
+        # Fast path cho query đúng bằng một compound word (1-3 tokens, phổ biến nhất)
+        self._compound_query_terms = {
+            phrase: tuple(terms)
+            for phrase, (terms, is_compound) in phrase_entries.items()
+            if is_compound
         }
-        return entities
-    
-    def _load_vietnamese_stopwords(self) -> Set[str]:
-        """Load stopwords tiếng Việt cơ bản"""
+        
+        # Per-instance LRU caches (cùng query/chunk được tokenize nhiều lần); entries là tuples
+        self._enhanced_cache = lru_cache(maxsize=4096)(self._tokenize_enhanced_impl)
+        self._search_terms_cache = lru_cache(maxsize=1024)(self._create_search_terms_impl)
+        
+    def _phrase_entries(self) -> Dict[str, Tuple[List[str], bool]]:
+        """
+        Phrase (compound word hoặc entity variant) -> (search terms của phrase,
+        phrase có phải compound word không)
+        """
+        phrase_terms = defaultdict(list)
+        for compound in self.compound_words:
+            phrase_terms[compound].append(compound)
+        for canonical, variants in self.named_entities.items():
+            for variant in variants:
+                if canonical not in phrase_terms[variant]:
+                    phrase_terms[variant].append(canonical)
+        
         return {
-            'là', 'của', 'và', 'có', 'được', 'trong', 'với', 'từ', 'về', 'cho',
-            'một', 'hai', 'ba', 'này', 'đó', 'những', 'các', 'tất cả', 'mọi',
-            'để', 'sẽ', 'đã', 'đang', 'rất', 'rất nhiều', 'nhiều', 'ít'
+            phrase: (terms, phrase in self.compound_words)
+            for phrase, terms in phrase_terms.items()
         }
     
+    def _build_phrase_trie(self, phrase_entries: Dict[str, Tuple[List[str], bool]]) -> Dict:
+        """
+        Trie theo token của compound words và entity variants
+        
+        Node là dict token -> node con; key None ở node cuối phrase giữ entry của phrase
+        """
+        trie = {}
+        for phrase, entry in phrase_entries.items():
+            node = trie
+            for token in phrase.split():
+                node = node.setdefault(token, {})
+            node[None] = entry
+        return trie
+    
     def extract_compound_words(self, text: str) -> List[str]:
         """Extract compound words từ text"""
-        text_lower = text.lower()
-        found_compounds = []
-        
-        for compound in self.compound_words:
-            if compound in text_lower:
-                found_compounds.append(compound)
-        
-        # Sort by length (longest first) để avoid conflicts
-        found_compounds.sort(key=len, reverse=True)
-        return found_compounds
+        return self._extract_compound_words_lower(text.lower())
+    
+    def _extract_compound_words_lower(self, text_lower: str) -> List[str]:
+        """extract_compound_words cho text đã lowercase"""
+        ranks = sorted({rank for _, rank in self._compound_ac.iter(text_lower)})
+        return [self._compounds_by_len[rank] for rank in ranks]
     
     def extract_named_entities(self, text: str) -> List[Tuple[str, str]]:
         """Extract named entities và normalize về canonical form"""
-        text_lower = text.lower()
-        found_entities = []
-        
-        for canonical, variants in self.named_entities.items():
-            for variant in variants:
-                if variant in text_lower:
-                    found_entities.append((variant, canonical))
-        
-        return found_entities
+        return self._extract_named_entities_lower(text.lower())
+    
+    def _extract_named_entities_lower(self, text_lower: str) -> List[Tuple[str, str]]:
+        """extract_named_entities cho text đã lowercase"""
+        # Giữ thứ tự khai báo của named_entities
+        found = sorted({match for _, match in self._entity_ac.iter(text_lower)})
+        return [(variant, canonical) for _, variant, canonical in found]
     
     def generate_ngrams(self, tokens: List[str], n: int = 2) -> List[str]:
         """Generate n-grams từ token list"""
         if len(tokens) < n:
             return []
         
-        ngrams = []
-        for i in range(len(tokens) - n + 1):
-            ngram = ' '.join(tokens[i:i+n])
-            ngrams.append(ngram)
+        join = ' '.join
+        # Bigrams/trigrams: zip + map chạy hoàn toàn trong C
+        if n == 2:
+            return list(map(join, zip(tokens, tokens[1:])))
+        if n == 3:
+            return list(map(join, zip(tokens, tokens[1:], tokens[2:])))
         
-        return ngrams
+        return [join(tokens[i:i+n]) for i in range(len(tokens) - n + 1)]
     
     def tokenize_basic(self, text: str) -> List[str]:
         """Basic tokenization (word-level)"""
-        # Normalize text
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', ' ', text)  # Remove punctuation
+        return self._tokenize_basic_lower(text.lower())
+    
+    def _tokenize_basic_lower(self, text: str) -> List[str]:
+        """tokenize_basic cho text đã lowercase"""
+        text = _PUNCT_RE.sub(' ', text)  # Remove punctuation
         
         # Split by whitespace
         tokens = text.split()
         
-        # Filter stopwords
-        tokens = [token for token in tokens if token not in self.stopwords]
+        # Filter stopwords (local binding: không lookup self.stopwords mỗi token)
+        stopwords = self.stopwords
+        tokens = [token for token in tokens if token not in stopwords]
         
         return tokens
     
+    def _bigrams_trigrams(self, tokens: List[str]) -> Tuple[List[str], List[str]]:
+        """Bigrams và trigrams trong một vòng lặp (trigram = bigram + token kế tiếp)"""
+        bigrams, trigrams = [], []
+        last = len(tokens) - 1
+        
+        for i in range(last):
+            bigram = tokens[i] + ' ' + tokens[i + 1]
+            bigrams.append(bigram)
+            if i + 1 < last:
+                trigrams.append(bigram + ' ' + tokens[i + 2])
+        
+        return bigrams, trigrams
+    
     def tokenize_enhanced(self, text: str) -> Dict[str, List[str]]:
         """
         Enhanced tokenization với compound words và n-grams
@@ -137,25 +259,31 @@ class VietnameseCompoundTokenizer:
         Returns:
             Dict với keys: 'tokens', 'compounds', 'entities', 'bigrams', 'trigrams'
         """
+        return {key: list(values) for key, values in self._enhanced_cache(text).items()}
+    
+    def _tokenize_enhanced_impl(self, text: str) -> Dict[str, Tuple]:
+        """tokenize_enhanced không cache; values là tuples"""
+        # Lowercase một lần cho cả ba bước
+        text_lower = text.lower()
+        
         # Basic tokens
-        basic_tokens = self.tokenize_basic(text)
+        basic_tokens = self._tokenize_basic_lower(text_lower)
         
         # Extract compound words
-        compounds = self.extract_compound_words(text)
+        compounds = self._extract_compound_words_lower(text_lower)
         
         # Extract named entities
-        entities = self.extract_named_entities(text)
+        entities = self._extract_named_entities_lower(text_lower)
         
         # Generate n-grams
-        bigrams = self.generate_ngrams(basic_tokens, 2)
-        trigrams = self.generate_ngrams(basic_tokens, 3)
+        bigrams, trigrams = self._bigrams_trigrams(basic_tokens)
         
         return {
-            'tokens': basic_tokens,
-            'compounds': compounds,
-            'entities': entities,
-            'bigrams': bigrams,
-            'trigrams': trigrams
+            'tokens': tuple(basic_tokens),
+            'compounds': tuple(compounds),
+            'entities': tuple(entities),
+            'bigrams': tuple(bigrams),
+            'trigrams': tuple(trigrams)
         }
     
     def create_search_terms(self, query: str) -> List[str]:
@@ -163,45 +291,69 @@ class VietnameseCompoundTokenizer:
         Tạo search terms optimized cho compound words
         
         Strategy:
-        1. Extract compound words first
-        2. Add individual tokens (except those in compounds)
-        3. Add relevant bigrams
-        4. Normalize entities
+        1. Duyệt tokens từ trái sang phải, match phrase dài nhất trong trie
+           (compound words + entity variants, entities normalize về canonical)
+        2. Add individual tokens không thuộc phrase nào
+        3. Add relevant bigrams (nếu không có compound word)
         """
-        enhanced = self.tokenize_enhanced(query)
+        return list(self._search_terms_cache(query))
+    
+    def _create_search_terms_impl(self, query: str) -> Tuple[str, ...]:
+        """create_search_terms không cache"""
+        # Query chính là một compound word: kết quả giống đường tổng quát
+        # (match toàn bộ query, không thêm bigrams)
+        fast_terms = self._compound_query_terms.get(query.lower().strip())
+        if fast_terms is not None:
+            return fast_terms
+        
+        # Giữ stopwords khi match phrase ('hai bà trưng')
+        words = _PUNCT_RE.sub(' ', query.lower()).split()
+        n_words = len(words)
+        trie = self._phrase_trie
+        stopwords = self.stopwords
         
         search_terms = []
-        used_tokens = set()
-        
-        # 1. Add compound words (highest priority)
-        for compound in enhanced['compounds']:
-            search_terms.append(compound)
-            # Mark component tokens as used
-            compound_tokens = compound.split()
-            used_tokens.update(compound_tokens)
-        
-        # 2. Add normalized entities
-        for variant, canonical in enhanced['entities']:
-            if canonical not in search_terms:
-                search_terms.append(canonical)
-            # Mark variant tokens as used
-            variant_tokens = variant.split()
-            used_tokens.update(variant_tokens)
-        
-        # 3. Add remaining individual tokens
-        for token in enhanced['tokens']:
-            if token not in used_tokens and len(token) > 2:
-                search_terms.append(token)
-        
-        # 4. Add meaningful bigrams (if no compounds found)
-        if len(enhanced['compounds']) == 0 and len(enhanced['bigrams']) > 0:
+        seen = set()
+        has_compound = False
+        
+        i = 0
+        while i < n_words:
+            # Longest match bắt đầu từ words[i]
+            node = trie
+            match = None
+            j = i
+            while j < n_words:
+                node = node.get(words[j])
+                if node is None:
+                    break
+                j += 1
+                if None in node:
+                    match = (j, node[None])
+            
+            if match is not None:
+                i, (terms, is_compound) = match
+                has_compound = has_compound or is_compound
+                for term in terms:
+                    if term not in seen:
+                        seen.add(term)
+                        search_terms.append(term)
+            else:
+                token = words[i]
+                if len(token) > 2 and token not in stopwords and token not in seen:
+                    seen.add(token)
+                    search_terms.append(token)
+                i += 1
+        
+        # Add meaningful bigrams (if no compounds found)
+        if not has_compound:
+            tokens = [word for word in words if word not in stopwords]
             # Add top 2 bigrams
-            for bigram in enhanced['bigrams'][:2]:
-                if bigram not in search_terms:
+            for bigram in self.generate_ngrams(tokens, 2)[:2]:
+                if bigram not in seen:
+                    seen.add(bigram)
                     search_terms.append(bigram)
         
-        return search_terms
-
+        return tuple(search_terms)
 
 def test_compound_tokenizer():
     """Test compound tokenizer"""
@@ -223,21 +375,24 @@ def test_compound_tokenizer():
     ]
     
     for query in test_queries:
-        print(f"\n📝 Query: '{query}'")
+        # Gom output của mỗi query, ghi ra stdout một lần
+        buf = io.StringIO()
+        print(f"\n📝 Query: '{query}'", file=buf)
         
         # Enhanced tokenization
         enhanced = tokenizer.tokenize_enhanced(query)
         
-        print(f"   Basic tokens: {enhanced['tokens']}")
-        print(f"   Compounds: {enhanced['compounds']}")
-        print(f"   Entities: {enhanced['entities']}")
-        print(f"   Bigrams: {enhanced['bigrams']}")
+        print(f"   Basic tokens: {enhanced['tokens']}", file=buf)
+        print(f"   Compounds: {enhanced['compounds']}", file=buf)
+        print(f"   Entities: {enhanced['entities']}", file=buf)
+        print(f"   Bigrams: {enhanced['bigrams']}", file=buf)
         
         # Search terms
         search_terms = tokenizer.create_search_terms(query)
-        print(f"   🎯 Search terms: {search_terms}")
+        print(f"   🎯 Search terms: {search_terms}", file=buf)
         
-        print("-" * 40)
+        print("-" * 40, file=buf)
+        sys.stdout.write(buf.getvalue())
 
 
 def compare_tokenization_approaches():
@@ -264,23 +419,25 @@ def compare_tokenization_approaches():
     ]
     
     for text in test_cases:
-        print(f"\n📄 Text: '{text}'")
+        buf = io.StringIO()
+        print(f"\n📄 Text: '{text}'", file=buf)
         
         # Simple approach
         simple_tokens = simple_tokenizer.tokenize(text)
-        print(f"   Simple: {simple_tokens}")
+        print(f"   Simple: {simple_tokens}", file=buf)
         
         # Compound approach
         search_terms = compound_tokenizer.create_search_terms(text)
-        print(f"   Compound: {search_terms}")
+        print(f"   Compound: {search_terms}", file=buf)
         
         # Analysis
         simple_score = len([t for t in simple_tokens if len(t) > 2])
         compound_score = len(search_terms)
         
-        print(f"   → Simple: {simple_score} meaningful terms")
-        print(f"   → Compound: {compound_score} search terms")
-        print(f"   → Improvement: {compound_score - simple_score:+d}")
+        print(f"   → Simple: {simple_score} meaningful terms", file=buf)
+        print(f"   → Compound: {compound_score} search terms", file=buf)
+        print(f"   → Improvement: {compound_score - simple_score:+d}", file=buf)
+        sys.stdout.write(buf.getvalue())
 
 
 if __name__ == "__main__":
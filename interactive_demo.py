@@ -3,6 +3,9 @@ interactive_demo.py
 Demonstrate the interactive features and different search modes
 """
 
+import io
+import sys
+
 from EnhancedSearchEngine import EnhancedSearchEngine
 
 def demonstrate_search_modes():
@@ -41,25 +44,29 @@ def demonstrate_search_modes():
     ]
     
     for query in test_queries:
-        print(f"\n" + "="*60)
-        print(f"🔍 TESTING QUERY: '{query}'")
-        print("="*60)
+        # Gom output của mỗi query, ghi ra stdout một lần
+        buf = io.StringIO()
+        print(f"\n" + "="*60, file=buf)
+        print(f"🔍 TESTING QUERY: '{query}'", file=buf)
+        print("="*60, file=buf)
+        
+        # Một lần scoring cho cả hai mode
+        results = engine.search_multi(query, top_k=2, modes=('document', 'chunk'))
         
         # Document mode
-        print(f"\n📄 DOCUMENT MODE:")
-        doc_results = engine.search(query, top_k=2, search_mode='document')
-        for i, result in enumerate(doc_results, 1):
-            print(f"  [{i}] {result['file_name']} (Score: {result['score']:.3f})")
-            print(f"      Preview: {result.get('preview', 'N/A')[:100]}...")
+        print(f"\n📄 DOCUMENT MODE:", file=buf)
+        for i, result in enumerate(results['document'], 1):
+            print(f"  [{i}] {result['file_name']} (Score: {result['score']:.3f})", file=buf)
+            print(f"      Preview: {result.get('preview', 'N/A')[:100]}...", file=buf)
         
         # Chunk mode  
-        print(f"\n🧩 CHUNK MODE:")
-        chunk_results = engine.search(query, top_k=2, search_mode='chunk')
-        for i, result in enumerate(chunk_results, 1):
-            print(f"  [{i}] {result['file_name']} - {result['chunk_type']}")
-            print(f"      Score: {result['score']:.3f}")
+        print(f"\n🧩 CHUNK MODE:", file=buf)
+        for i, result in enumerate(results['chunk'], 1):
+            print(f"  [{i}] {result['file_name']} - {result['chunk_type']}", file=buf)
+            print(f"      Score: {result['score']:.3f}", file=buf)
             content = result['content'].replace('\n', ' ')[:80]
-            print(f"      Content: {content}...")
+            print(f"      Content: {content}...", file=buf)
+        sys.stdout.write(buf.getvalue())
     
     # Show system statistics
     print(f"\n" + "="*60)
@@ -1,7 +1,27 @@
+import os
+import sys
 from typing import List, Dict, Tuple
 from DataHandler import DataHandler
 from Tokenizer import VietnameseTokenizer
 from DataRetrieval import DataRetrieval
+from QueryCache import QueryResultCache
+
+try:
+    import readline  # noqa: F401  Lịch sử query bằng phím mũi tên cho input()
+except ImportError:
+    pass
+
+
+_CLEAR_SCREEN = "\x1b[2J\x1b[H"
+
+
+def _clear_screen():
+    """Xóa màn hình bằng ANSI escape, không tạo shell process mỗi query"""
+    if os.name == 'nt' and not os.environ.get('WT_SESSION'):
+        os.system('cls')  # Console Windows cũ không hiểu ANSI escape
+    else:
+        sys.stdout.write(_CLEAR_SCREEN)
+        sys.stdout.flush()
 
 
 class SearchEngine:
@@ -46,12 +66,25 @@ class SearchEngine:
             embedding_model=self.config['embedding_model'],
             use_bm25=self.config['use_bm25'],
             use_embedding=self.config['use_embedding'],
-            bm25_weight=self.config['bm25_weight']
+            bm25_weight=self.config['bm25_weight'],
+            embedding_precision=self.config.get('embedding_precision', 'float32'),
+            use_faiss=self.config.get('use_faiss', True)
         )
         
         # 4. Storage cho documents
         self.documents = []
         self.tokenized_documents = []
+        self.previews = []  # content rút gọn 500 ký tự, song song với documents
+        
+        # Cache kết quả cho query lặp lại; dùng lại kết quả của query gần giống
+        # (cosine >= threshold) chỉ khi bật 'semantic_cache'
+        self.query_cache = QueryResultCache(
+            maxsize=self.config.get('query_cache_size', 512),
+            similarity_threshold=(
+                self.config.get('semantic_cache_threshold', 0.95)
+                if self.config.get('semantic_cache', False) else None
+            )
+        )
         
         print("\n✓ Khởi tạo hoàn tất!")
     
@@ -69,7 +102,10 @@ class SearchEngine:
             'use_bm25': True,
             'use_embedding': True,
             'bm25_weight': 0.5,
-            'top_k_results': 10
+            'top_k_results': 10,
+            'embedding_precision': 'float32',  # 'float16' / 'int8': embeddings nhỏ hơn 2x / 4x
+            'use_faiss': True,  # FAISS top-k cho embedding search (nếu đã cài faiss)
+            'tokenize_workers': None  # Số process tokenize (None = số CPU, 1 = tuần tự)
         }
     
     def build_index(self):
@@ -92,9 +128,17 @@ class SearchEngine:
         # Trích xuất content
         contents = [doc['content'] for doc in self.documents]
         
+        # Preview cho kết quả search, cắt một lần thay vì mỗi query
+        self.previews = [
+            content[:500] + '...' if len(content) > 500 else content
+            for content in contents
+        ]
+        
         # Bước 2: Tokenize
         print("\n[2/3] Đang tokenize documents...")
-        self.tokenized_documents = self.tokenizer.tokenize_documents(contents)
+        self.tokenized_documents = self.tokenizer.tokenize_documents(
+            contents, n_workers=self.config.get('tokenize_workers')
+        )
         print(f"✓ Đã tokenize {len(self.tokenized_documents)} documents")
         
         # Bước 3: Index
@@ -103,6 +147,7 @@ class SearchEngine:
             tokenized_docs=self.tokenized_documents,
             raw_docs=contents
         )
+        self.query_cache.clear()
         
         print("\n✓ Hoàn tất xây dựng index!")
         print("=" * 60)
@@ -121,6 +166,12 @@ class SearchEngine:
         if top_k is None:
             top_k = self.config['top_k_results']
         
+        # Query đã search (hoặc gần giống về nghĩa): dùng lại kết quả
+        embed = self.retrieval.encode_query if self.retrieval.use_embedding else None
+        cached = self.query_cache.get(query, top_k, embed)
+        if cached is not None:
+            return cached
+        
         # Tokenize query
         query_tokens = self.tokenizer.tokenize(query)
         
@@ -139,9 +190,10 @@ class SearchEngine:
                 'doc_id': doc_id,
                 'score': score,
                 'file_name': doc['file_name'],
-                'content': doc['content'][:500] + '...' if len(doc['content']) > 500 else doc['content']
+                'content': self.previews[doc_id]
             })
         
+        self.query_cache.put(query, top_k, formatted_results, embed)
         return formatted_results
     
     def print_results(self, query: str, results: List[Dict]):
@@ -206,20 +258,23 @@ def main():
     print("\n" + "=" * 60)
     print("INTERACTIVE SEARCH MODE")
     print("=" * 60)
-    print("Nhập 'quit' để thoát\n")
+    print("Nhập 'quit' để thoát, ':cache' để xem thống kê cache\n")
     
     while True:
         query = input("Nhập query: ").strip()
 
-        if query.lower() == 'quit':
+        if query.casefold() == 'quit':
             print("Tạm biệt!")
             break
         
         if not query:
             continue
         
-        import os
-        os.system('cls')
+        if query == ':cache':
+            print(f"Query cache: {engine.query_cache.get_stats()}")
+            continue
+        
+        _clear_screen()
         results = engine.search(query)
         engine.print_results(query, results)
 
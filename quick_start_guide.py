@@ -5,6 +5,10 @@
 🚀 QUICK START GUIDE - Enhanced Vietnamese Search Engine
 """
 
+import io
+import sys
+from contextlib import redirect_stdout
+
 def print_quick_start_guide():
     """In hướng dẫn nhanh để bắt đầu"""
     
@@ -23,13 +27,16 @@ def print_quick_start_guide():
         'CompoundWordSearchEngine.py'
     ]
     
-    missing_files = []
+    # Một lần liệt kê thư mục thay vì stat từng file
+    with os.scandir('.') as entries:
+        present = {entry.name for entry in entries}
+    
+    missing_files = [file for file in required_files if file not in present]
     for file in required_files:
-        if os.path.exists(file):
+        if file in present:
             print(f"   ✅ {file} - OK")
         else:
             print(f"   ❌ {file} - MISSING")
-            missing_files.append(file)
     
     if missing_files:
         print(f"\n⚠️  Thiếu files: {missing_files}")
@@ -39,10 +46,10 @@ def print_quick_start_guide():
     print("\n📦 BƯỚC 2: CÀI ĐẶT PACKAGES (nếu chưa có)")
     print("-" * 40)
     print("   Chạy lệnh sau để cài đặt:")
-    print("   pip install sentence-transformers rank-bm25 underthesea pyvi scikit-learn numpy")
+    print("   pip install sentence-transformers underthesea pyvi numpy scipy orjson")
     print("   \n   Hoặc nếu gặp lỗi, dùng:")
     print("   pip install --upgrade pip")
-    print("   pip install sentence-transformers rank-bm25 scikit-learn numpy")
+    print("   pip install sentence-transformers numpy scipy")
     
     print("\n🎯 BƯỚC 3: CHỌN PHIÊN BẢN SỬ DỤNG")
     print("-" * 40)
@@ -97,7 +104,8 @@ def quick_demo():
     print("=" * 40)
     
     try:
-        from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine
+        from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine, enable_console_logging
+        enable_console_logging()
         
         print("📋 Initializing search engine...")
         engine = FixedEnhancedSearchEngine('data_content.json')
@@ -188,7 +196,7 @@ def troubleshooting_guide():
     
     print("❌ LỖI: ModuleNotFoundError")
     print("   Giải pháp:")
-    print("   pip install sentence-transformers rank-bm25 scikit-learn numpy")
+    print("   pip install sentence-transformers numpy scipy")
     print("   hoặc:")
     print("   pip install --user [package_name]")
     
@@ -223,22 +231,29 @@ def troubleshooting_guide():
 
 
 if __name__ == "__main__":
-    # Print complete guide
-    success = print_quick_start_guide()
+    # Các phần hướng dẫn là text tĩnh: gom lại, ghi ra stdout một lần
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        # Print complete guide
+        success = print_quick_start_guide()
+    sys.stdout.write(buf.getvalue())
     
     if success:
-        # Run quick demo
+        # Run quick demo (in tiến trình trực tiếp)
         print("\n" + "="*70)
         quick_demo()
         
-        # Interactive help
-        interactive_help()
-        
-        # Troubleshooting
-        troubleshooting_guide()
-        
-        print("\n" + "="*70)
-        print("🎯 READY TO START!")
-        print("   → Chạy: python EnhancedSearchEngine_Fixed.py")
-        print("   → Hoặc: python CompoundWordSearchEngine.py")
-        print("="*70)
\ No newline at end of file
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            # Interactive help
+            interactive_help()
+            
+            # Troubleshooting
+            troubleshooting_guide()
+            
+            print("\n" + "="*70)
+            print("🎯 READY TO START!")
+            print("   → Chạy: python EnhancedSearchEngine_Fixed.py")
+            print("   → Hoặc: python CompoundWordSearchEngine.py")
+            print("="*70)
+        sys.stdout.write(buf.getvalue())
\ No newline at end of file
@@ -12,7 +12,8 @@ def run_simple_demo():
     print("=" * 50)
     
     try:
-        from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine
+        from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine, enable_console_logging
+        enable_console_logging()
         
         print("📋 Starting engine...")
         engine = FixedEnhancedSearchEngine('data_content.json')
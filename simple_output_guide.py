@@ -3,6 +3,10 @@ simple_output_guide.py
 Hướng dẫn đơn giản để hiểu output
 """
 
+import io
+import sys
+from contextlib import redirect_stdout
+
 def explain_build_output():
     """Giải thích output khi build index"""
     print("🔧 GIẢI THÍCH OUTPUT BUILD INDEX")
@@ -164,13 +168,17 @@ def main():
     print("🎯 HƯỚNG DẪN ĐỌC HIỂU OUTPUT ENHANCED SEARCH ENGINE")
     print("="*70)
     
-    explain_build_output()
-    explain_search_output() 
-    explain_scores()
-    explain_chunk_types()
-    explain_search_modes()
-    show_real_examples()
-    interactive_commands()
+    # Toàn bộ hướng dẫn là text tĩnh: gom lại, ghi ra stdout một lần
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        explain_build_output()
+        explain_search_output() 
+        explain_scores()
+        explain_chunk_types()
+        explain_search_modes()
+        show_real_examples()
+        interactive_commands()
+    sys.stdout.write(buf.getvalue())
     
     print("\n" + "="*70)
     print("✅ HOÀN TẤT HƯỚNG DẪN!")
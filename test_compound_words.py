@@ -5,16 +5,26 @@
 Test compound words và multi-word expressions trong tiếng Việt
 """
 
-from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine
+from functools import lru_cache
 
-def test_compound_words():
+from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine, enable_console_logging
+
+def build_engine():
+    """Build engine một lần, dùng chung cho các test bên dưới"""
+    engine = FixedEnhancedSearchEngine('data_content.json')
+    engine.build_index()
+    # Query và preview được tokenize lại nhiều lần trong các test
+    engine.tokenizer.tokenize = lru_cache(maxsize=4096)(engine.tokenizer.tokenize)
+    return engine
+
+def test_compound_words(engine=None):
     """Test các từ ghép tiếng Việt"""
     
     print("🇻🇳 TESTING VIETNAMESE COMPOUND WORDS")
     print("=" * 60)
     
-    engine = FixedEnhancedSearchEngine('data_content.json')
-    engine.build_index()
+    if engine is None:
+        engine = build_engine()
     
     # Test cases cho từ ghép tiếng Việt
     test_cases = [
@@ -70,15 +80,17 @@ def test_compound_words():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
+    # Tất cả queries trong một lượt search_batch
+    all_results = engine.search_batch([test_case['query'] for test_case in test_cases], top_k=3)
+    
+    for i, (test_case, results) in enumerate(zip(test_cases, all_results), 1):
         print(f"\n[{i}] Testing: '{test_case['query']}'")
         print(f"    Description: {test_case['description']}")
         print(f"    Expected: {test_case['expected']}")
         
-        # Search with compound word
-        results = engine.search(test_case['query'], top_k=3)
-        
         print(f"    Results: {len(results)} found")
+        query_tokens = engine.tokenizer.tokenize(test_case['query'])
+        query_token_set = set(query_tokens)
         for j, result in enumerate(results[:3], 1):
             score = result['score']
             file_name = result['file_name']
@@ -88,23 +100,22 @@ def test_compound_words():
             print(f"          Preview: {preview}...")
             
             # Analyze token matching
-            query_tokens = engine.tokenizer.tokenize(test_case['query'])
             preview_tokens = engine.tokenizer.tokenize(preview)
-            matches = set(query_tokens) & set(preview_tokens)
+            matches = query_token_set & set(preview_tokens)
             
             print(f"          Query tokens: {query_tokens}")
             print(f"          Matching: {list(matches)} ({len(matches)}/{len(query_tokens)})")
         
         print("-" * 50)
 
-def analyze_compound_word_issues():
+def analyze_compound_word_issues(engine=None):
     """Phân tích các vấn đề với từ ghép"""
     
     print("\n🔍 COMPOUND WORD ANALYSIS")
     print("=" * 60)
     
-    engine = FixedEnhancedSearchEngine('data_content.json')
-    engine.build_index()
+    if engine is None:
+        engine = build_engine()
     
     # So sánh từ ghép vs từ riêng lẻ
     comparisons = [
@@ -116,11 +127,17 @@ def analyze_compound_word_issues():
         ('cách mạng', ['cách', 'mạng'])
     ]
     
+    # Compound, từng component và combined query của mọi cặp: một lượt search_batch
+    queries = []
+    for compound, components in comparisons:
+        queries.extend([compound, *components, ' '.join(components)])
+    results_by_query = dict(zip(queries, engine.search_batch(queries, top_k=3)))
+    
     for compound, components in comparisons:
         print(f"\n📝 Analyzing: '{compound}' vs {components}")
         
         # Test compound word
-        compound_results = engine.search(compound, top_k=3)
+        compound_results = results_by_query[compound]
         compound_scores = [r['score'] for r in compound_results]
         
         print(f"   Compound query '{compound}':")
@@ -128,21 +145,21 @@ def analyze_compound_word_issues():
         
         # Test individual components
         for component in components:
-            component_results = engine.search(component, top_k=3)
+            component_results = results_by_query[component]
             component_scores = [r['score'] for r in component_results]
             print(f"   Component '{component}':")
             print(f"   → Scores: {[f'{s:.4f}' for s in component_scores[:3]]}")
         
         # Test combined search (all components)
         combined_query = ' '.join(components)
-        combined_results = engine.search(combined_query, top_k=3) 
+        combined_results = results_by_query[combined_query]
         combined_scores = [r['score'] for r in combined_results]
         print(f"   Combined '{combined_query}':")
         print(f"   → Scores: {[f'{s:.4f}' for s in combined_scores[:3]]}")
         
         print("-" * 40)
 
-def test_ngram_approach():
+def test_ngram_approach(engine=None):
     """Test cách tiếp cận n-gram cho từ ghép"""
     
     print("\n🔬 N-GRAM APPROACH TEST")
@@ -156,40 +173,36 @@ def test_ngram_approach():
         "Khởi nghĩa Bà Triệu chống lại quân Nam Hán"
     ]
     
-    def extract_bigrams(text, tokenizer):
-        """Extract bigrams from text"""
-        tokens = tokenizer.tokenize(text.lower())
-        bigrams = []
-        for i in range(len(tokens) - 1):
-            bigrams.append(f"{tokens[i]} {tokens[i+1]}")
-        return bigrams
-    
-    def extract_trigrams(text, tokenizer):
-        """Extract trigrams from text"""
-        tokens = tokenizer.tokenize(text.lower())
-        trigrams = []
-        for i in range(len(tokens) - 2):
-            trigrams.append(f"{tokens[i]} {tokens[i+1]} {tokens[i+2]}")
-        return trigrams
+    def extract_bigrams(tokens):
+        """Extract bigrams from tokens"""
+        return list(map(' '.join, zip(tokens, tokens[1:])))
     
-    engine = FixedEnhancedSearchEngine('data_content.json')
+    def extract_trigrams(tokens):
+        """Extract trigrams from tokens"""
+        return list(map(' '.join, zip(tokens, tokens[1:], tokens[2:])))
+    
+    if engine is None:
+        # Chỉ cần tokenizer, không cần build index
+        engine = FixedEnhancedSearchEngine('data_content.json')
     
     for text in sample_texts:
         print(f"\nText: '{text}'")
         
-        # Regular tokens
+        # Regular tokens (tokenize một lần cho cả bigrams và trigrams)
         tokens = engine.tokenizer.tokenize(text.lower())
         print(f"Tokens: {tokens}")
         
         # Bigrams
-        bigrams = extract_bigrams(text, engine.tokenizer)
+        bigrams = extract_bigrams(tokens)
         print(f"Bigrams: {bigrams}")
         
         # Trigrams  
-        trigrams = extract_trigrams(text, engine.tokenizer)
+        trigrams = extract_trigrams(tokens)
         print(f"Trigrams: {trigrams}")
 
 if __name__ == "__main__":
-    test_compound_words()
-    analyze_compound_word_issues()
-    test_ngram_approach()
\ No newline at end of file
+    enable_console_logging()
+    engine = build_engine()
+    test_compound_words(engine)
+    analyze_compound_word_issues(engine)
+    test_ngram_approach(engine)
\ No newline at end of file
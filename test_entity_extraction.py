@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Regression test cho extract_important_entities: entities của các category
+khác nhau có thể chồng nhau (kết quả giống bản gốc, mỗi pattern scan riêng)
+"""
+
+from EnhancedVietnameseTokenizer import EnhancedVietnameseTokenizer
+
+# (text, entities mà bản gốc trả về)
+OVERLAPPING_CASES = [
+    (
+        'Ông Nguyễn Văn A sinh năm 1890 tại thành_phố Hà Nội',
+        {
+            'persons': ['Ông Nguyễn Văn A sinh năm'],
+            'locations': ['thành_phố Hà Nội'],
+            'historical_periods': [],
+            'years': ['năm 1890'],
+            'compound_words': ['thành_phố'],
+        },
+    ),
+    (
+        'Vua Quang Trung đại phá quân Thanh năm 1789',
+        {
+            'persons': ['Vua Quang Trung đại phá quân Thanh năm'],
+            'locations': [],
+            'historical_periods': [],
+            'years': ['năm 1789'],
+            'compound_words': [],
+        },
+    ),
+    (
+        'thời_kỳ Bắc thuộc kéo dài, tỉnh Nghệ An năm 1930',
+        {
+            'persons': [],
+            'locations': ['tỉnh Nghệ An năm'],
+            'historical_periods': ['thời_kỳ Bắc thuộc k'],
+            'years': ['năm 1930'],
+            'compound_words': ['thời_kỳ'],
+        },
+    ),
+]
+
+def test_overlapping_entities():
+    """Year / compound word nằm trong span person / location vẫn được giữ"""
+    tokenizer = EnhancedVietnameseTokenizer()
+
+    for text, expected in OVERLAPPING_CASES:
+        entities = tokenizer.extract_important_entities(text)
+        print(f"🔍 {text}")
+        print(f"    {entities}")
+        assert entities == expected, f"{text!r}: {entities} != {expected}"
+
+    print("✅ Entity extraction khớp với bản gốc")
+
+if __name__ == "__main__":
+    test_overlapping_entities()
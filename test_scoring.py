@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine
+import io
+import sys
+from collections import Counter
+
+from EnhancedSearchEngine_Fixed import FixedEnhancedSearchEngine, enable_console_logging
 
 def test_scoring():
     engine = FixedEnhancedSearchEngine('data_content.json')
@@ -18,41 +22,57 @@ def test_scoring():
         "Việt Nam lịch sử"
     ]
     
-    for query in queries:
-        print(f"\n{'='*60}")
-        print(f"🔍 QUERY: '{query}'")
-        print(f"{'='*60}")
+    # Tất cả queries trong một lượt search_batch
+    all_results = engine.search_batch(queries, top_k=3)
+    
+    for query, results in zip(queries, all_results):
+        # Gom output của mỗi query, ghi ra stdout một lần
+        buf = io.StringIO()
+        print(f"\n{'='*60}", file=buf)
+        print(f"🔍 QUERY: '{query}'", file=buf)
+        print(f"{'='*60}", file=buf)
         
-        results = engine.search(query, top_k=3)
+        # Query tokens không đổi giữa các results
+        query_tokens = engine.tokenizer.tokenize(query)
+        query_tokens_set = set(query_tokens)
         
-        for i, result in enumerate(results[:3]):
-            print(f"\n[{i+1}] Score: {result['score']:.6f}")
-            print(f"    File: {result['file_name']}")
-            print(f"    Preview: {result['preview'][:120]}...")
+        for i, result in enumerate(results):
+            print(f"\n[{i+1}] Score: {result['score']:.6f}", file=buf)
+            print(f"    File: {result['file_name']}", file=buf)
+            print(f"    Preview: {result['preview'][:120]}...", file=buf)
             
             # Show token matching info
-            query_tokens = engine.tokenizer.tokenize(query)
             chunk_tokens = engine.tokenizer.tokenize(result['preview'])
+            # Một lần duyệt chunk_tokens cho cả matching lẫn tf
+            chunk_token_counts = Counter(chunk_tokens)
+            
+            matches = query_tokens_set & chunk_token_counts.keys()
+            print(f"    Query tokens: {query_tokens}", file=buf)
+            print(f"    Matching terms: {list(matches)} ({len(matches)}/{len(query_tokens)})", file=buf)
             
-            matches = set(query_tokens) & set(chunk_tokens)
-            print(f"    Query tokens: {query_tokens}")  
-            print(f"    Matching terms: {list(matches)} ({len(matches)}/{len(query_tokens)})")
+            # Không có term nào khớp: score = 0, bỏ qua vòng tính tay
+            if not matches:
+                print(f"    Manual calculated score: {0.0:.6f}", file=buf)
+                print(f"    Chunk length: {len(chunk_tokens)} tokens", file=buf)
+                continue
             
             # Calculate manual score for verification
             score = 0.0
-            chunk_token_counts = {}
-            for token in chunk_tokens:
-                chunk_token_counts[token] = chunk_token_counts.get(token, 0) + 1
                     
             for query_token in query_tokens:
-                if query_token in chunk_token_counts:
-                    tf = chunk_token_counts[query_token]
+                tf = chunk_token_counts.get(query_token, 0)
+                if tf:
                     normalized_tf = tf / len(chunk_tokens) if len(chunk_tokens) > 0 else 0
                     score += normalized_tf
-                    print(f"    Term '{query_token}': tf={tf}, normalized_tf={normalized_tf:.6f}")
+                    print(f"    Term '{query_token}': tf={tf}, normalized_tf={normalized_tf:.6f}", file=buf)
             
-            print(f"    Manual calculated score: {score:.6f}")
-            print(f"    Chunk length: {len(chunk_tokens)} tokens")
+            print(f"    Manual calculated score: {score:.6f}", file=buf)
+            print(f"    Chunk length: {len(chunk_tokens)} tokens", file=buf)
+        
+        sys.stdout.write(buf.getvalue())
+    
+    assert all(len(r) <= 3 for r in all_results)  # search_batch đã giới hạn top_k
 
 if __name__ == "__main__":
+    enable_console_logging()
     test_scoring()
\ No newline at end of file